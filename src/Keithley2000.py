@@ -1,6 +1,42 @@
 import pyvisa
 import time
-import math
+
+import numpy as np
+
+from measurement_profile import DEFAULT_PROFILE, Profile, setting_key
+from scan_plan import compile_plan
+from scpi_readings import (
+    Statistics,
+    decode_binary,
+    first_reading,
+    parse_ascii,
+    parse_statistics,
+)
+from sensor_conversions import (
+    convert_readings,
+    convert_statistics,
+    convert_value,
+    raw_config,
+)
+
+# Trigger model after *RST: one reading per READ?, no scan, no buffer
+ONE_SHOT_STATE = {
+    "INIT:CONT": "INIT:CONT OFF",
+    "SAMP:COUN": "SAMP:COUN 1",
+    "TRIG:COUN": "TRIG:COUN 1",
+    "ROUT:SCAN:LSEL": "ROUT:SCAN:LSEL NONE",
+}
+# raw configurations the internal scan can measure, one function per scan
+SCAN_CONFIGS = ("Voltage", "Resistance", "Frequency")
+BUFFER_SIZE = 1024  # readings of the TRAC buffer
+# Range and digits of voltage/current channels whose profile leaves them unset,
+# the setting the data logger always measured with
+MEAS_RANGE = 10
+MEAS_RESOLUTION = 5
+# mean, standard deviation, min and max of the buffer (CALC2) in one response
+STATISTICS_QUERY = ";".join(
+    f":CALC2:FORM {name};:CALC2:IMM?" for name in ("MEAN", "SDEV", "MIN", "MAX")
+)
 
 
 class Keithley2000:
@@ -11,26 +47,97 @@ class Keithley2000:
     def __init__(self, device):
         self.device = device
         self.numChannels = 10
-        self.aquisitionTime = 1
+        self.aquisitionTime = 1  # expected duration of one reading in seconds
+        self.state = {}  # last command sent for every setting of the instrument
+        # ---- Timing model ------------
+        self.relaySettleTime = 0.01  # settle time of the scanner card relays in seconds
+        self.lineFrequency = 50  # power line frequency in Hz, queried on init
+        self.autoZero = True  # autozero triples the integration time (signal, reference, zero)
+        self.minTimeout = 2000  # minimal VISA timeout in ms
+        self.closedChannel = None
+        self.closedAt = 0.0
+        # Readings are transferred as binary doubles (FORM:DATA DREAL), except on
+        # serial ports where flow control and termination characters can
+        # collide with the binary data
+        serial = str(getattr(device, "resource_name", "")).upper().startswith("ASRL")
+        self.binaryReadback = hasattr(device, "query_binary_values") and not serial
+        # ---- Internal scan ------------
+        self.scanPlan = None  # channels grouped by their measurement setting
+        # (configs, channels, profile) per setting; runs of several channels are
+        # scanned by the trigger model, single channels read one by one
+        self.scanSteps = {}
+        self.scanSetting = None  # setting of the last measured group
+        self.scanCount = 1
 
     def init(self):
         """Initializes the instruent and resets it"""
         self.device.write("*RST")
         self.device.write("*CLS")
+        self.invalidateState()
+        self.state.update(ONE_SHOT_STATE)
+        try:
+            self.lineFrequency = float(self.device.query("SYST:LFR?"))
+        except (pyvisa.VisaIOError, ValueError):
+            pass
+
+    # ---- Shadow State Functions ------------
+    def invalidateState(self):
+        """Forgets the cached instrument configuration, such that every setting is sent again"""
+        self.state = {}
+        self.closedChannel = None
+
+    def writeSetting(self, setting, command):
+        """Writes the command only if the setting was not already applied by the same command"""
+        if self.state.get(setting) == command:
+            return False
+        self.device.write(command)
+        self.state[setting] = command
+        return True
 
     # ---- Switch Control Functions ------------
     def closeChannel(self, channelNumber):
-        self.device.write("ROUT:OPEN:ALL")  # Open all channels
-        time.sleep(0.1)
+        """Closes the specific channel, the instrument opens any other closed channel first.
+        Nothing is sent if the channel is already closed."""
+        if self.closedChannel == channelNumber:
+            return
+        # channels cannot be closed while the internal scan is enabled
+        self.writeSetting("ROUT:SCAN:LSEL", "ROUT:SCAN:LSEL NONE")
         self.device.write(f"ROUT:CLOS (@{channelNumber})")  # Close the specific channel
+        self.closedChannel = channelNumber
+        self.closedAt = time.monotonic()
         return
 
     def openChannel(self, channelNumber):
         self.device.write("ROUTE:OPEN (@" + str(channelNumber) + ")")
+        self.closedChannel = None
 
     def openAllChannels(self):
         command = "ROUTE:OPEN:ALL"
         self.device.write(command)
+        self.closedChannel = None
+        self.state["ROUT:SCAN:LSEL"] = "ROUT:SCAN:LSEL NONE"  # also stops the scan
+
+    # ---- Timing Functions ------------
+    def integrationTime(self, nplc):
+        """Returns the expected duration of one reading in seconds for the given NPLC"""
+        cycles = nplc * (3 if self.autoZero else 1)
+        return cycles / self.lineFrequency
+
+    def waitForSettle(self):
+        """Waits until the relay of the closed channel has settled, which usually
+        already happened while the measurement was configured"""
+        remaining = self.closedAt + self.relaySettleTime - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def ensureTimeout(self, duration=None):
+        """Raises the VISA timeout if the expected reading (or an operation of
+        duration seconds) would take longer"""
+        if duration is None:
+            duration = self.aquisitionTime
+        timeout = max(self.minTimeout, int(2000 * duration) + 1000)
+        if self.device.timeout is None or self.device.timeout < timeout:
+            self.device.timeout = timeout
 
     def getNumChannels(self):
         return self.numChannels
@@ -44,155 +151,326 @@ class Keithley2000:
         if function == "FRES":
             self.configRes4W(measRange, resolution)
 
+    def configDataFormat(self):
+        """Selects the binary (little endian doubles) or ASCII reading format"""
+        self.writeSetting("FORM:ELEM", "FORM:ELEM READ")
+        if self.binaryReadback:
+            self.writeSetting("FORM:BORD", "FORM:BORD SWAP")
+            self.writeSetting("FORM:DATA", "FORM:DATA DREAL")
+        else:
+            self.writeSetting("FORM:DATA", "FORM:DATA ASC")
+
+    def readValues(self, command, count=1):
+        """Queries count readings and returns them as float array (NaN if invalid).
+        Binary blocks are decoded straight into the array, if the binary transfer
+        fails the driver falls back to ASCII."""
+        self.configDataFormat()
+        if self.binaryReadback:
+            try:
+                # every reading is sent as "#0" header and 8 bytes
+                block = self.device.query_binary_values(
+                    command,
+                    datatype="B",
+                    header_fmt="empty",
+                    data_points=10 * count,
+                    container=np.array,
+                )
+                return decode_binary(block, count=count)
+            except (pyvisa.errors.InvalidBinaryFormat, ValueError) as e:
+                print(f"Keithley binary transfer failed, using ASCII: {e}")
+                self.binaryReadback = False
+                self.invalidateState()
+                self.configDataFormat()
+        return parse_ascii(self.device.query(command))
+
     def readValue(self):
         """Reads the value from the instrument in the current configuration."""
         try:
-            response = self.device.query("READ?")
-            # Remove non-numeric and non-standard characters
-            cleaned = "".join(c for c in response if c in "0123456789.-eE+")
-            value = float(cleaned)
+            self.waitForSettle()
+            self.ensureTimeout()
+            self.writeSetting("SAMP:COUN", "SAMP:COUN 1")
+            self.writeSetting("TRIG:COUN", "TRIG:COUN 1")
+            # READ? triggers the reading and returns once it is complete
+            value = first_reading(self.readValues("READ?"))
+            if value is None:
+                raise ValueError("invalid reading")
             return value
+        except (pyvisa.VisaIOError, pyvisa.errors.InvalidBinaryFormat, ValueError) as e:
+            print(f"Keithley measurement error: {e}")
+            self.invalidateState()
+            return None
+
+    def readStatistics(self, count):
+        """Takes count readings of the closed channel with one trigger into the
+        buffer and returns their Statistics (CALC2), queried in one response"""
+        try:
+            self.waitForSettle()
+            self.ensureTimeout(count * self.aquisitionTime)
+            self.writeSetting("INIT:CONT", "INIT:CONT OFF")
+            self.writeSetting("SAMP:COUN", f"SAMP:COUN {count}")
+            self.writeSetting("TRIG:COUN", "TRIG:COUN 1")
+            self.writeSetting("TRAC:POIN", f"TRAC:POIN {count}")
+            self.writeSetting("TRAC:FEED", "TRAC:FEED SENS1")
+            self.writeSetting("CALC2:STAT", "CALC2:STAT ON")
+            # the CALC2 results are sent in the reading format
+            self.writeSetting("FORM:ELEM", "FORM:ELEM READ")
+            self.writeSetting("FORM:DATA", "FORM:DATA ASC")
+            # *WAI holds the calculations back until the readings are stored
+            response = self.device.query(
+                f"TRAC:FEED:CONT NEXT;:INIT;*WAI;{STATISTICS_QUERY}"
+            )
+            stats = parse_statistics(response, count)[0]
+            if stats is None:
+                raise ValueError("invalid reading")
+            return stats
         except (pyvisa.VisaIOError, ValueError) as e:
             print(f"Keithley measurement error: {e}")
+            self.invalidateState()
             return None
 
-    def measureChannel(self, config, chanel, measRange=1000, measResolution=7):
-        """closes one specific channel, configures it and measures the value, which is cleaned and returned"""
+    def measureChannel(
+        self,
+        config,
+        chanel,
+        measRange=MEAS_RANGE,
+        measResolution=MEAS_RESOLUTION,
+        profile=None,
+    ):
+        """closes one specific channel, configures it and measures the value, which is cleaned and returned
+        profile (range, digits, NPLC, autozero) replaces measRange/measResolution
+        where it is set; channels averaged by their profile return the
+        Statistics of the readings"""
+        profile = self.profileFor(config, measRange, measResolution, profile)
         try:
-            self.openAllChannels()
             self.closeChannel(chanel)
-            if config == "Voltage":
-                self.configVoltageDC(measRange, measResolution)
-            elif config == "Resistance":
-                self.configRes2W(measRange, measResolution)
-            elif config == "Current":
-                self.configCurrentDC(measRange, measResolution)
-            elif config == "Frequency":
-                self.configFreq(measRange, measResolution)
-            elif config == "PT100":
-                return self.measurePt100(measRange, measResolution)
-            elif config == "NTC_44006":
-                return self.measureNTC_44006(measRange, measResolution)
-            elif config == "NTC_44007":
-                return self.measureNTC_44007(measRange, measResolution)
-            elif config == "IKR020":
-                return self.measureIKR020(measRange, measResolution)
-            time.sleep(self.aquisitionTime)
-            return self.readValue()
-        except pyvisa.VisaIOError as e:
+            self.configure(config, profile)
+            if profile.averaged:
+                stats = self.readStatistics(profile.average)
+                if stats is None:
+                    return None
+                values = convert_statistics([config], [stats[:4]])[0]
+                return Statistics(*values.tolist(), stats.count)
+            return convert_value(config, self.readValue())
+        except (pyvisa.VisaIOError, pyvisa.errors.InvalidBinaryFormat) as e:
             print(f"Keithley measurement error: {e}")
+            # the instrument state is unknown after a failed transfer
+            self.invalidateState()
             return None
 
-    # ---- Local used functions -----
-    def configVoltageDC(self, measRange, measResolution):
-        """Configures the Meter to DC voltage
+    # ---- Internal Scan Functions ------------
+    def configureScan(
+        self,
+        channelConfigs,
+        measRange=MEAS_RANGE,
+        measResolution=MEAS_RESOLUTION,
+        scanCount=1,
+        profiles=None,
+    ):
+        """Prepares the measurement of the given channels with the internal scanner
         Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        # Check resolution limits & adjust if necessary
-        if measResolution < 4:
-            measResolution = 4
-        if measResolution > 7:
-            measResolution = 7
-        else:
-            measResolution = int(measResolution)
+        channelConfigs -- dict {channel: configuration} of the channels to measure
+        scanCount      -- scans per measureScan, the readings are averaged
+        profiles       -- dict {channel: Profile}, see measureChannel
+        The trigger model scans 2 to 10 consecutive channels of one function, so
+        channels are grouped by their measurement setting (scan plan) and into
+        runs of consecutive channels; all other channels and the channels averaged
+        by their profile are measured one by one."""
+        if not 1 <= scanCount <= BUFFER_SIZE // self.numChannels:
+            raise ValueError(f"scanCount must be 1..{BUFFER_SIZE // self.numChannels}")
+        self.scanCount = scanCount
+        profiles = {
+            ch: self.profileFor(
+                config, measRange, measResolution, (profiles or {}).get(ch)
+            )
+            for ch, config in channelConfigs.items()
+        }
+        self.scanPlan = compile_plan(
+            tuple(
+                (ch, setting_key(raw_config(config), profiles[ch]))
+                for ch, config in channelConfigs.items()
+            )
+        )
+        self.scanSteps = {}
+        for setting, channels in self.scanPlan.groups:
+            runs = []
+            for channel in channels:
+                if runs and channel - 1 == runs[-1][-1]:
+                    runs[-1].append(channel)
+                else:
+                    runs.append([channel])
+            profile = profiles[channels[0]]
+            scannable = raw_config(channelConfigs[channels[0]]) in SCAN_CONFIGS
+            # averaged channels use the buffer statistics of their own readings
+            if not scannable or profile.averaged:
+                runs = [[channel] for channel in channels]
+            # a run of one channel is read on its own
+            self.scanSteps[setting] = [
+                ([channelConfigs[ch] for ch in run], run, profile) for run in runs
+            ]
 
-        command = 'FUNC "VOLT:DC";SENS:VOLT:NPLC 10'  # Config to Voltage DC
-        self.device.write(command)
+    def measureScan(self):
+        """Measures the channels of configureScan and returns {channel: value}.
+        The groups of the scan plan start with the function the meter is in."""
+        results = {}
+        if self.scanPlan is None:
+            return results
+        for setting, _ in self.scanPlan.rotated(self.scanSetting):
+            self.scanSetting = setting
+            for configs, channels, profile in self.scanSteps[setting]:
+                if len(channels) > 1:
+                    results.update(self.scanChannels(configs, channels, profile))
+                else:
+                    results[channels[0]] = self.measureChannel(
+                        configs[0], channels[0], profile=profile
+                    )
+        return results
 
-        command = "SENS:VOLT:DC:RANG " + str(measRange)
-        self.device.write(command)
+    def scanChannels(self, configs, channels, profile=DEFAULT_PROFILE):
+        """Scans the consecutive channels (configs of the same raw function)
+        scanCount times with the trigger model, stores the readings in the buffer
+        and reads them with one transfer"""
+        count = len(channels) * self.scanCount
+        results = {channel: None for channel in channels}
+        try:
+            self.configure(configs[0], profile)
+            # one scan of the list per trigger, the relays settle before each reading
+            self.writeSetting("INIT:CONT", "INIT:CONT OFF")
+            self.writeSetting("TRIG:DEL", f"TRIG:DEL {self.relaySettleTime}")
+            self.writeSetting("SAMP:COUN", f"SAMP:COUN {len(channels)}")
+            self.writeSetting("TRIG:COUN", f"TRIG:COUN {self.scanCount}")
+            self.writeSetting("TRAC:POIN", f"TRAC:POIN {max(2, count)}")
+            self.writeSetting("TRAC:FEED", "TRAC:FEED SENS1")
+            command = f"ROUT:SCAN:INT (@{channels[0]}:{channels[-1]})"
+            self.writeSetting("ROUT:SCAN", command)
+            self.writeSetting("ROUT:SCAN:LSEL", "ROUT:SCAN:LSEL INT")
+            self.closedChannel = None
+            self.ensureTimeout(count * (self.aquisitionTime + self.relaySettleTime))
+            # the buffer stops storing when it is full and is armed again for every
+            # run; *OPC? answers once the trigger model is idle again
+            self.device.query("TRAC:FEED:CONT NEXT;:INIT;*OPC?")
+            readings = self.readValues("TRAC:DATA?", count)
+        except pyvisa.VisaIOError as e:
+            print(f"Keithley scan error: {e}")
+            self.invalidateState()
+            return results
+        if len(readings) != count:
+            print(f"Keithley scan error: {len(readings)} of {count} readings")
+            return results
+        # readings are stored scan after scan in the order of the scan list
+        readings = readings.reshape(self.scanCount, len(channels))
+        valid = np.isfinite(readings)
+        with np.errstate(invalid="ignore"):
+            raw = np.where(valid, readings, 0).sum(axis=0) / valid.sum(axis=0)
+        values = convert_readings(configs, raw)
+        for channel, value in zip(channels, values.tolist()):
+            results[channel] = None if value != value else value
+        return results
 
-        command = "SENS:VOLT:DC:DIG " + str(measResolution)
-        self.device.write(command)
+    # ---- Local used functions -----
+    def profileFor(self, config, measRange, measResolution, profile=None):
+        """Profile of a channel, the fields profile leaves unset are defaults:
+        range and digits only apply to voltage and current, the instrument's
+        defaults to everything else"""
+        defaults = DEFAULT_PROFILE
+        if raw_config(config) in ("Voltage", "Current"):
+            defaults = Profile(range=measRange, digits=measResolution)
+        return defaults if profile is None else profile.merged(defaults)
 
-        self.aquisitionTime = 1
+    def configure(self, config, profile):
+        """Configures the raw function of a channel configuration with the
+        autozero, range, digits and NPLC (aperture) of its profile"""
+        self.configAutoZero(profile.autozero)
+        function = raw_config(config)
+        if function == "Voltage":
+            self.configVoltageDC(profile.range, profile.digits, profile.nplc)
+        elif function == "Resistance":
+            self.configRes2W(profile.range, profile.digits, profile.nplc)
+        elif function == "Current":
+            self.configCurrentDC(profile.range, profile.digits, profile.nplc)
+        elif function == "Frequency":
+            self.configFreq(profile.range, profile.digits, profile.aperture)
 
-    def configRes2W(self, measRange, measResolution):
-        """Configures the Meter to 2 Wire Resistance
-        Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        command = "CONF:RES"
-        self.device.write(command)
+    def configAutoZero(self, autoZero=None):
+        """Switches autozero on (default) or off, which also sets the timing model"""
+        self.autoZero = autoZero is not False
+        command = f"SYST:AZER:STAT {'ON' if self.autoZero else 'OFF'}"
+        self.writeSetting("SYST:AZER", command)
 
-    def configCurrentDC(self, measRange, measResolution):
-        """Configures the Meter to DC current
-        Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
+    def configSense(self, function, measRange, measResolution, nplc):
+        """Writes range (None or AUTORANGE: autorange), digits (None: 7) and NPLC
+        of a function"""
         # Check resolution limits & adjust if necessary
-        if measResolution < 4:
-            measResolution = 4
-        if measResolution > 7:
-            measResolution = 7
+        digits = 7 if measResolution is None else min(max(int(measResolution), 4), 7)
+        node = function.split(":")[0]
+        self.writeSetting(f"{node}:NPLC", f"SENS:{node}:NPLC {nplc:g}")
+        if not measRange:
+            command = f"SENS:{function}:RANG:AUTO ON"
         else:
-            measResolution = int(measResolution)
-
-        command = 'FUNC "CURR:DC";SENS:CURR:NPLC 10'  # Config to Current DC
-        self.device.write(command)
+            command = f"SENS:{function}:RANG {measRange:g}"
+        self.writeSetting(f"{function}:RANG", command)
+        self.writeSetting(f"{function}:DIG", f"SENS:{function}:DIG {digits}")
+        self.aquisitionTime = self.integrationTime(nplc)
 
-        command = "SENS:CURR:DC:RANG " + str(measRange)
-        self.device.write(command)
+    def configVoltageDC(self, measRange, measResolution, nplc=None):
+        """Configures the Meter to DC voltage
+        Arguments:
+        measRange      -- float measurement range [0.1, 1, 10, 100, 1000], None: auto
+        measResolution -- int measurement resolution in digit[4,5,6,7]
+        nplc           -- integration time in NPLC [0.01..10], default 10"""
+        self.writeSetting("FUNC", 'FUNC "VOLT:DC"')  # Config to Voltage DC
+        self.configSense("VOLT:DC", measRange, measResolution, nplc or 10)
 
-        command = "SENS:CURR:DC:DIG " + str(measResolution)
-        self.device.write(command)
+    def configRes2W(self, measRange, measResolution, nplc=None):
+        """Configures the Meter to 2 Wire Resistance
+        Arguments:
+        measRange      -- float measurement range [100, 1e3, ... 100e6], None: auto
+        measResolution -- int measurement resolution in digit[4,5,6,7]
+        nplc           -- integration time in NPLC [0.01..10], default 1"""
+        self.writeSetting("FUNC", 'FUNC "RES"')
+        self.configSense("RES", measRange, measResolution, nplc or 1)
 
-        self.aquisitionTime = 1
+    def configCurrentDC(self, measRange, measResolution, nplc=None):
+        """Configures the Meter to DC current
+        Arguments:
+        measRange      -- float measurement range [0.01, 0.1, 1, 3], None: auto
+        measResolution -- int measurement resolution in digit[4,5,6,7]
+        nplc           -- integration time in NPLC [0.01..10], default 10"""
+        self.writeSetting("FUNC", 'FUNC "CURR:DC"')  # Config to Current DC
+        self.configSense("CURR:DC", measRange, measResolution, nplc or 10)
 
-    def configFreq(self, measRange, measResolution):
+    def configFreq(self, measRange, measResolution, aperture=None):
         """Configures the Meter to Frequency
         Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        command = "conf:FREQ"
-        self.device.write(command)
+        measRange      -- not used, the input range is selected automatically
+        measResolution -- int measurement resolution in digit[4,5,6,7]
+        aperture       -- gate time in seconds [0.01..1], default 1"""
+        self.writeSetting("FUNC", 'FUNC "FREQ"')
+        aperture = aperture or 1
+        self.writeSetting("FREQ:APER", f"SENS:FREQ:APER {aperture:g}")
+        digits = 7 if measResolution is None else min(max(int(measResolution), 4), 7)
+        self.writeSetting("FREQ:DIG", f"SENS:FREQ:DIG {digits}")
+        self.aquisitionTime = aperture  # gate time of the frequency counter
+
+    def measureSensor(self, config, measRange, measResolution):
+        """Measures the raw signal of a registered sensor and converts it"""
+        self.configure(config, self.profileFor(config, measRange, measResolution))
+        return convert_value(config, self.readValue())
 
     def measurePt100(self, measRange, measResolution):
         """Configures the Meter to PT100 temperature measurement"""
-        self.configRes2W(measRange, measResolution)
-        resistance = self.readValue()
-        # t=(-AR_0+srt((AR_0)^2-4BR_0(R_0-R)))/2BR_0
-        A = 3.9827e-3
-        B = -5.875e-7
-        R_0 = 100.0  # PT100 resistance at 0°C
-        temperature = (
-            -A * R_0 + (A**2 * R_0**2 - 4 * B * R_0 * (R_0 - resistance)) ** 0.5
-        ) / (2 * B * R_0)
-        return temperature
+        return self.measureSensor("PT100", measRange, measResolution)
 
     def measureNTC_44006(self, measRange, measResolution):
         """Calculate temperature from NTC thermistor resistance using Steinhart-Hart equation."""
-        self.configRes2W(measRange, measResolution)
-        resistance = self.readValue()
-        A = 1.032e-3
-        B = 2.387e-4
-        C = 1.580e-7
-        log_resistance = math.log(resistance)
-        inv_temp = A + B * log_resistance + C * log_resistance**3
-        temperature_kelvin = 1 / inv_temp
-        temperature_celsius = temperature_kelvin - 273.15
-        return temperature_celsius
+        return self.measureSensor("NTC_44006", measRange, measResolution)
 
     def measureNTC_44007(self, measRange, measResolution):
         """Calculate temperature from NTC thermistor resistance using Steinhart-Hart equation."""
-        self.configRes2W(measRange, measResolution)
-        resistance = self.readValue()
-        A = 1.285e-3
-        B = 2.362e-4
-        C = 9.285e-8
-        log_resistance = math.log(resistance)
-        inv_temp = A + B * log_resistance + C * log_resistance**3
-        temperature_kelvin = 1 / inv_temp
-        temperature_celsius = temperature_kelvin - 273.15
-        return temperature_celsius
+        return self.measureSensor("NTC_44007", measRange, measResolution)
 
     def measureIKR020(self, measRange, measResolution):
         """Calculate the pressure from the IKR020 sensor."""
-        self.configVoltageDC(measRange, measResolution)
-        voltage = self.readValue()
-        pressure = 9*(10**(-14))*(voltage**9.6465)
-        return pressure
+        return self.measureSensor("IKR020", measRange, measResolution)
 
     def getConfig(self):
         config = self.device.query("FUNC?")
@@ -0,0 +1,320 @@
+"""Benchmarks of the acquisition path against the simulated instruments.
+
+The simulated instruments run with time_scale=0, so only the cost of the
+Python code is measured (driver, parsing, conversions, controller cycle), not
+the modelled instrument time.
+
+Usage (from the src directory):
+    python benchmarks.py                       run all benchmarks
+    python benchmarks.py -k scan               only benchmarks containing "scan"
+    python benchmarks.py --save base.json      store the results as a baseline
+    python benchmarks.py --compare base.json   flag regressions against a baseline
+
+In compare mode the exit code is 1 if any benchmark got slower than the
+baseline by more than --threshold (default 25 %).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from Keithley2000 import Keithley2000
+from keyseight_DAC970A import KeysightDAQ970A
+from measurement_profile import Profile
+from scpi_readings import decode_binary, parse_ascii
+from sensor_conversions import convert_readings
+from simulated_instrument import SimulatedResource, constant
+
+CONFIGS = [
+    "Voltage",
+    "Resistance",
+    "Current",
+    "Frequency",
+    "PT100",
+    "NTC_44006",
+    "NTC_44007",
+    "IKR020",
+]
+CYCLE_CHANNELS = [1, 10, 20, 120]
+# raw signal of the sensor configurations, the others use the default waveforms
+SENSOR_SIGNALS = {"PT100": 108.0, "NTC_44006": 10e3, "NTC_44007": 5e3, "IKR020": 5.0}
+
+
+class FixedResponse:
+    """Resource answering every query with the same response, for parsing."""
+
+    def __init__(self, response: str):
+        self.response = response
+        self.timeout = 10000
+
+    def write(self, command):
+        pass
+
+    def query(self, command):
+        return self.response
+
+
+def _simulated(model: str, configs: Dict[int, str]) -> SimulatedResource:
+    """Simulated instrument without any delays (the relays settle at once),
+    configs maps its channels to the configuration they are measured with."""
+    waveforms = {
+        ch: constant(SENSOR_SIGNALS[config])
+        for ch, config in configs.items()
+        if config in SENSOR_SIGNALS
+    }
+    return SimulatedResource(
+        model,
+        waveforms=waveforms,
+        time_scale=0,
+        bus_latency=0,
+        relay_settle=0,
+        seed=0,
+    )
+
+
+# ---- benchmark cases, each returns {name: function to time} -----
+def driver_benchmarks() -> Dict[str, Callable[[], object]]:
+    cases = {}
+    for config in CONFIGS:
+        keithley = Keithley2000(_simulated("Keithley2000", {1: config}))
+        keithley.init()
+        keithley.relaySettleTime = 0
+        cases[f"keithley.measureChannel[{config}]"] = (
+            lambda keithley=keithley, config=config: keithley.measureChannel(
+                config, 1, 10, 5
+            )
+        )
+        daq = KeysightDAQ970A(_simulated("KeysightDAQ970A", {101: config}))
+        daq.init()
+        cases[f"daq.measureChannel[{config}]"] = (
+            lambda daq=daq, config=config: daq.measureChannel(config, 1, 10, 5)
+        )
+        daq = KeysightDAQ970A(_simulated("KeysightDAQ970A", {101: config}))
+        daq.init()
+
+        def measure(daq=daq, config=config):
+            daq.configureScan({1: config}, 10, 5)
+            return daq.measureScan()
+
+        cases[f"daq.scan1[{config}]"] = measure
+    # internal scan of the whole scanner card, drained from the buffer at once
+    configs = {ch: "PT100" for ch in range(1, 11)}
+    keithley = Keithley2000(_simulated("Keithley2000", configs))
+    keithley.init()
+    keithley.relaySettleTime = 0
+    keithley.configureScan(configs, 10, 5)
+    cases["keithley.scan10[PT100]"] = keithley.measureScan
+    # averaged on the instrument, 20 readings and their statistics per value
+    averaged = Profile(average=20)
+    keithley = Keithley2000(_simulated("Keithley2000", {1: "IKR020"}))
+    keithley.init()
+    keithley.relaySettleTime = 0
+    cases["keithley.average20[IKR020]"] = lambda: keithley.measureChannel(
+        "IKR020", 1, profile=averaged
+    )
+    daq = KeysightDAQ970A(_simulated("KeysightDAQ970A", {101: "IKR020"}))
+    daq.init()
+    daq.configureScan({1: "IKR020"}, profiles={1: averaged})
+    cases["daq.average20[IKR020]"] = daq.measureScan
+    return cases
+
+
+def parsing_benchmarks() -> Dict[str, Callable[[], object]]:
+    # FORM:ELEM READ: readings come without units
+    keithley = Keithley2000(FixedResponse("+1.23456789E+00"))
+    keithley.relaySettleTime = 0
+    daq = KeysightDAQ970A(FixedResponse(""))
+    readings = ",".join(["+1.23456789E+00"] * 120)
+    block = (b"#0" + struct.pack("<d", 1.23456789)) * 120
+    return {
+        "keithley.readValue": keithley.readValue,
+        "daq.parseReadings[120]": lambda: daq.parseReadings(readings),
+        "parse_ascii[120]": lambda: parse_ascii(readings),
+        "decode_binary[120]": lambda: decode_binary(block),
+    }
+
+
+def conversion_benchmarks() -> Dict[str, Callable[[], object]]:
+    daq = KeysightDAQ970A(FixedResponse(""))
+    configs = [CONFIGS[i % len(CONFIGS)] for i in range(120)]
+    raw = [SENSOR_SIGNALS.get(config, 1.0) for config in configs]
+    return {
+        "convert.PT100": lambda: daq.convertReading("PT100", 108.0),
+        "convert.NTC_44006": lambda: daq.convertReading("NTC_44006", 10e3),
+        "convert.NTC_44007": lambda: daq.convertReading("NTC_44007", 5e3),
+        "convert.IKR020": lambda: daq.convertReading("IKR020", 5.0),
+        "convert.scan[120]": lambda: convert_readings(configs, raw),
+    }
+
+
+def cycle_benchmarks(tmp_dir: str) -> Dict[str, Callable[[], object]]:
+    """One full acquisition cycle (measure, store, run log, broadcast)."""
+    from measurement_web_ui.controller import MeasurementController
+
+    cases = {}
+    for scan_mode, model in ((True, "KeysightDAQ970A"), (False, "Keithley2000")):
+        for n in CYCLE_CHANNELS:
+            # keep the benchmark samples out of the real run log
+            controller = MeasurementController(
+                run_log_path=os.path.join(tmp_dir, f"{model}_{n}.sqlite")
+            )
+            controller.scan_mode = scan_mode
+            address = f"SIM::{model}::INSTR"
+            configs = {ch: CONFIGS[(ch - 1) % len(CONFIGS)] for ch in range(1, n + 1)}
+            offset = 100 if scan_mode else 0
+            resource = _simulated(
+                model, {ch + offset: config for ch, config in configs.items()}
+            )
+            controller.instruments[address] = (
+                KeysightDAQ970A if scan_mode else Keithley2000
+            )(resource)
+            controller.instrument_types[address] = model
+            controller._executors[address] = _InlineExecutor()
+            if not scan_mode:
+                controller.instruments[address].relaySettleTime = 0
+            controller.number_of_channels = n
+            controller.store.resize(n)
+            for ch in range(1, n + 1):
+                controller.channel_active[ch] = True
+                controller.channel_config[ch] = configs[ch]
+                controller.channel_instrument[ch] = ""
+                controller.channel_local[ch] = ch
+            mode = "scan" if scan_mode else "sequential"
+            channels = list(range(1, n + 1))
+            cases[f"cycle.{mode}[{n}]"] = (
+                lambda controller=controller, channels=channels: (
+                    controller._measure_cycle(channels)
+                )
+            )
+    return cases
+
+
+class _InlineExecutor:
+    """Runs submitted calls right away, keeps thread hand-off out of the timing."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+# ---- runner -----
+def measure(fn: Callable[[], object], repeat: int = 5, target: float = 0.2) -> dict:
+    """Seconds per call: calibrates the iterations to about target seconds per
+    round and returns min/median over repeat rounds."""
+    fn()  # warm up (state caches, imports)
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target / 10 or number >= 1_000_000:
+            break
+        number *= 10
+    number = max(1, int(number * target / max(elapsed, 1e-9)))
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    return {
+        "median_s": statistics.median(rounds),
+        "min_s": min(rounds),
+        "iterations": number,
+    }
+
+
+def run(pattern: str = "", repeat: int = 5) -> Dict[str, dict]:
+    with tempfile.TemporaryDirectory(prefix="outgassing_bench_") as tmp_dir:
+        cases = {}
+        cases.update(driver_benchmarks())
+        cases.update(parsing_benchmarks())
+        cases.update(conversion_benchmarks())
+        cases.update(cycle_benchmarks(tmp_dir))
+        results = {}
+        for name, fn in cases.items():
+            if pattern and pattern not in name:
+                continue
+            results[name] = measure(fn, repeat)
+            print(f"{name:40s} {_format(results[name]['median_s'])}")
+    return results
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], threshold: float
+) -> List[Tuple[str, float]]:
+    """Print the change against the baseline and return the regressions."""
+    regressions = []
+    print(f"\n{'benchmark':40s} {'baseline':>10s} {'now':>10s} {'change':>8s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, now = baseline[name]["median_s"], result["median_s"]
+        ratio = now / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append((name, ratio))
+        print(
+            f"{name:40s} {_format(before)} {_format(now)} "
+            f"{(ratio - 1) * 100:+7.1f}%{flag}"
+        )
+    return regressions
+
+
+def _format(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f}{unit:>2s}"
+    return f"{seconds / 1e-9:8.2f}ns"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-k", dest="pattern", default="", help="name filter")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", help="write the results as JSON baseline")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"\nBaseline written to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
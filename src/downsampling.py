@@ -0,0 +1,128 @@
+"""Shape-preserving downsampling of measurement series for plotting.
+
+Two methods are provided:
+
+* min/max per pixel bucket -- splits the time range into ``width`` buckets and
+  keeps the first/last time and the minimum/maximum of every bucket. All
+  channels share the same time axis and the data can be fed chunk by chunk,
+  so whole runs can be reduced without loading them at once. Pre-aggregated
+  min/max buckets (rollups) can be folded in the same way.
+* LTTB (Largest-Triangle-Three-Buckets) -- keeps the points of a single series
+  that span the largest triangles, which preserves peaks and the visual shape.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class MinMaxAccumulator:
+    """Streaming min/max decimation onto a fixed grid of ``width`` buckets.
+
+    Feed time ordered chunks with add(); result() returns at most 2 * width
+    rows (the minimum at the first and the maximum at the last time of every
+    non-empty bucket).
+    """
+
+    def __init__(self, start: float, end: float, width: int, number_of_channels: int):
+        self.start = start
+        self.span = max(end - start, 1)
+        self.width = max(int(width), 1)
+        self.t_first = np.zeros(self.width, dtype=np.int64)
+        self.t_last = np.zeros(self.width, dtype=np.int64)
+        self.seen = np.zeros(self.width, dtype=bool)
+        self.vmin = np.full((self.width, number_of_channels), np.nan)
+        self.vmax = np.full((self.width, number_of_channels), np.nan)
+
+    def add(self, times: np.ndarray, values: np.ndarray):
+        self.add_buckets(times, times, values, values)
+
+    def add_buckets(
+        self,
+        t_first: np.ndarray,
+        t_last: np.ndarray,
+        vmin: np.ndarray,
+        vmax: np.ndarray,
+    ):
+        """Fold time ordered, pre-aggregated buckets (e.g. rollups) in.
+
+        Every input bucket lands in the pixel bucket of its first time.
+        """
+        if len(t_first) == 0:
+            return
+        buckets = (t_first - self.start) * self.width // self.span
+        buckets = np.clip(buckets, 0, self.width - 1).astype(np.int64)
+        # times are sorted, so every bucket is one contiguous run of rows
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        ends = np.append(starts[1:], len(t_first)) - 1
+        ids = buckets[starts]
+        new = ~self.seen[ids]
+        self.t_first[ids[new]] = t_first[starts[new]]
+        self.t_last[ids] = t_last[ends]
+        self.seen[ids] = True
+        self.vmin[ids] = np.fmin(self.vmin[ids], np.fmin.reduceat(vmin, starts))
+        self.vmax[ids] = np.fmax(self.vmax[ids], np.fmax.reduceat(vmax, starts))
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.flatnonzero(self.seen)
+        times = np.empty(2 * len(ids), dtype=np.int64)
+        values = np.empty((2 * len(ids), self.vmin.shape[1]))
+        times[0::2], times[1::2] = self.t_first[ids], self.t_last[ids]
+        values[0::2], values[1::2] = self.vmin[ids], self.vmax[ids]
+        # buckets holding a single sample are only emitted once
+        keep = np.ones(len(times), dtype=bool)
+        keep[1::2] = self.t_last[ids] != self.t_first[ids]
+        return times[keep], values[keep]
+
+
+def minmax_decimate(
+    times: np.ndarray,
+    values: np.ndarray,
+    width: int,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce (times, values[n, channels]) to at most 2 * width rows."""
+    if len(times) <= 2 * width:
+        return times, values
+    start = times[0] if start is None else start
+    end = times[-1] if end is None else end
+    acc = MinMaxAccumulator(start, end, width, values.shape[1])
+    acc.add(times, values)
+    return acc.result()
+
+
+def lttb(x, y, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling of a single series.
+
+    NaN values are dropped first. Returns at most threshold points including the
+    first and the last one.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    # bucket edges for the n - 2 inner points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # average point of every bucket, used as the third triangle corner
+    avg_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / np.diff(edges)
+    avg_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / np.diff(edges)
+    avg_x = np.append(avg_x, x[-1])
+    avg_y = np.append(avg_y, y[-1])
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        # twice the triangle area of every candidate with the previous point and
+        # the average of the next bucket
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
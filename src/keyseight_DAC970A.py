@@ -1,21 +1,168 @@
 import pyvisa
 import time
-import math
+
+from measurement_profile import DEFAULT_PROFILE
+from scpi_readings import (
+    Statistics,
+    first_reading,
+    parse_ascii,
+    parse_statistics,
+    to_list,
+)
+from sensor_conversions import (
+    SENSORS,
+    TEMPERATURE,
+    convert_readings,
+    convert_statistics,
+    convert_value,
+)
 
 
 class KeysightDAQ970A:
     """A class to interface with the Keysight DAQ970A Data Acquisition System."""
 
+    # Measurement function used in the scan list for every channel configuration
+    SCAN_FUNCTIONS = {
+        "Voltage": "VOLT:DC",
+        "Resistance": "RES",
+        "Current": "CURR:DC",
+        "Frequency": "FREQ",
+        # sensors are read with the raw function they are registered with
+        **{name: sensor.function for name, sensor in SENSORS.items()},
+    }
+    # temperature sensors the DAQ970A converts itself (CONF:TEMP <type>,<param>):
+    # 2-wire RTD with alpha 0.00391, and the 10 kOhm (44006) and 5 kOhm (44007)
+    # thermistors; "FRTD" measures an RTD with 4 wires. Type 91 is the closest to
+    # the PT100 coefficients of sensor_conversions (alpha 0.003924, type 85 is
+    # 0.00385), native PT100 temperatures still differ slightly from converted ones
+    TEMPERATURE_TRANSDUCERS = {
+        "PT100": "RTD,91",
+        "NTC_44006": "THER,10000",
+        "NTC_44007": "THER,5000",
+    }
+    # integration time in NPLC giving the digits of a profile (4 = 3.5 digits)
+    DIGITS_NPLC = {4: 0.02, 5: 0.02, 6: 0.2, 7: 2}
+    # statistics of the readings since the last INIT, queried in one response
+    STATISTICS = ("AVER", "SDEV", "MIN", "MAX", "COUN")
+
     def __init__(self, device):
         self.device = device
         self.num_of_channels = 19
-        self.aquisition_time = 1
+        # seconds the instrument waits after closing a channel before measuring
+        # it (ROUT:CHAN:DEL), None for its automatic settling delay
+        self.channelDelay = None
+        self.scan_channels = {}
+        # {readings per channel: {channel: config}} of the averaged channels, one
+        # scan each
+        self.average_scans = {}
+        # last CONF function and profile of every channel, the active scan list
+        # and the sample count
+        self.state = {}
+        # temperature sensors converted by the instrument instead of by the
+        # sensor registry, e.g. ("NTC_44006",), set from the native column of
+        # the channel config. Off by default: the run log then only holds the
+        # temperature, so the channel cannot be reprocessed
+        self.nativeTemperature = ()
 
     def init(self):
         """Initializes the instruent and resets it"""
         self.device.write("*RST")
         self.device.write("*CLS")
         # self.device.write("*ABOR")
+        self.invalidateState()
+
+    # ---- Shadow State Functions ------------
+    def invalidateState(self):
+        """Forgets the cached instrument configuration, such that every setting is sent again"""
+        self.state = {}
+
+    @property
+    def nativeSensors(self):
+        """Sensor configurations measured and converted by the instrument"""
+        return tuple(
+            config
+            for config in self.nativeTemperature
+            if config in self.TEMPERATURE_TRANSDUCERS
+        )
+
+    def scanFunction(self, config):
+        """Measurement function of a configuration, None if it cannot be measured"""
+        if config in self.nativeSensors:
+            return f"TEMP {self.TEMPERATURE_TRANSDUCERS[config]}"
+        return self.SCAN_FUNCTIONS.get(config)
+
+    def readingConfig(self, config):
+        """Configuration the readings of a channel are converted with, the
+        readings of native sensors already are temperatures"""
+        return TEMPERATURE if config in self.nativeSensors else config
+
+    def configChannels(self, function, channels, profile=DEFAULT_PROFILE):
+        """Sends CONF:<function> and the profile only to the channels not already
+        configured to it
+        Arguments:
+        function -- str measurement function e.g. "VOLT:DC" or "TEMP RTD,91"
+        channels -- list of instrument channel numbers (starting at 101)
+        profile  -- Profile with range, NPLC/aperture, autozero and digits"""
+        setting = (function, profile, self.channelDelay)
+        changed = [ch for ch in channels if self.state.get(ch) != setting]
+        if changed:
+            channelList = f"(@{','.join(map(str, changed))})"
+            # the channel list follows the parameters of the function
+            separator = "," if " " in function else " "
+            self.device.write(f"CONF:{function}{separator}{channelList}")
+            # CONF sets the defaults, only the settings of the profile are sent
+            for command in self.profileCommands(function, profile):
+                self.device.write(f"{command},{channelList}")
+            if self.channelDelay is not None:
+                self.device.write(f"ROUT:CHAN:DEL {self.channelDelay:g},{channelList}")
+            for ch in changed:
+                self.state[ch] = setting
+            # CONF redefines the scan list to the configured channels and may
+            # reset the sample count
+            self.state["ROUT:SCAN"] = tuple(changed)
+            self.state.pop("SAMP:COUN", None)
+
+    def profileCommands(self, function, profile):
+        """SENS commands (without channel list) setting the profile of a function,
+        temperatures have no range"""
+        commands = []
+        if function == "FREQ":
+            if profile.aperture is not None:
+                commands.append(f"SENS:FREQ:APER {profile.aperture:g}")
+            return commands
+        function = function.split()[0]  # "TEMP RTD,91" is set up by SENS:TEMP
+        # CONF selects autorange, AUTORANGE needs no command
+        if profile.range and function != "TEMP":
+            commands.append(f"SENS:{function}:RANG {profile.range:g}")
+        nplc = profile.nplc
+        if nplc is None and profile.digits is not None:
+            nplc = self.DIGITS_NPLC[profile.digits]
+        if nplc is not None:
+            commands.append(f"SENS:{function}:NPLC {nplc:g}")
+        if profile.autozero is not None:
+            commands.append(
+                f"SENS:{function}:ZERO:AUTO {'ON' if profile.autozero else 'OFF'}"
+            )
+        return commands
+
+    def setScanList(self, channels):
+        """Sets the scan list unless it already contains exactly these channels"""
+        channels = tuple(channels)
+        if self.state.get("ROUT:SCAN") != channels:
+            self.device.write(f"ROUT:SCAN (@{','.join(map(str, channels))})")
+            self.state["ROUT:SCAN"] = channels
+
+    def setSampleCount(self, count):
+        """Sets the number of sweeps of the scan list per trigger"""
+        if self.state.get("SAMP:COUN") != count:
+            self.device.write(f"SAMP:COUN {count}")
+            self.state["SAMP:COUN"] = count
+
+    def ensureTimeout(self, timeout):
+        """Raises the VISA timeout to at least timeout ms, a longer one (e.g. of
+        configureScan) is kept"""
+        if self.device.timeout is None or self.device.timeout < timeout:
+            self.device.timeout = timeout
 
     # ---- Switch Control Functions ------------
     def closeChannel(self, channelNumber):
@@ -46,109 +193,227 @@ class KeysightDAQ970A:
     def readValue(self):
         """Reads the value from the instrument in the current configuration."""
         try:
-            response = self.device.query("READ?")
-            # Remove non-numeric and non-standard characters
-            cleaned = "".join(c for c in response if c in "0123456789.-eE+")
-            value = float(cleaned)
-            return value
+            return first_reading(parse_ascii(self.device.query("READ?")))
         except (pyvisa.VisaIOError, ValueError) as e:
-            print(f"Keithley measurement error: {e}")
+            print(f"Keyseight DAQ970A measurement error: {e}")
             return None
 
-    def measureChannel(self, config, channel, measRange=1000, measResolution=7):
-        """closes one specific channel, configures it and measures the value, which is cleaned and returned"""
+    def readStatistics(self, channels, count):
+        """Scans the channels count times with one trigger and returns
+        {channel: Statistics} of their readings (CALC:AVER), queried in one
+        response"""
+        self.setScanList(channels)
+        self.setSampleCount(count)
+        self.ensureTimeout(1000 * count * len(channels))
+        channelList = f"(@{','.join(map(str, channels))})"
+        queries = ";".join(
+            f":CALC:AVER:{name}? {channelList}" for name in self.STATISTICS
+        )
+        # *WAI holds the queries back until the scan is complete
+        response = self.device.query(
+            f"CALC:AVER:CLE {channelList};:INIT;*WAI;{queries}"
+        )
+        return dict(zip(channels, parse_statistics(response, count)))
+
+    def convertStatistics(self, configs, stats):
+        """Converts the raw Statistics of channels into sensor values"""
+        values = convert_statistics(configs, [s[:4] for s in stats]).tolist()
+        return [Statistics(*converted, s.count) for converted, s in zip(values, stats)]
+
+    def parseReadings(self, response):
+        """Parses a comma separated multi-reading response into a list of floats (None if invalid)."""
+        return to_list(parse_ascii(response))
+
+    # ---- Scan Functions ------------
+    def configureScan(
+        self, channelConfigs, measRange=1000, measResolution=7, profiles=None
+    ):
+        """Configures all given channels once and puts them into one scan list
+        Arguments:
+        channelConfigs -- dict {channel: configuration} of the channels to scan
+        profiles       -- dict {channel: Profile}, instrument defaults if missing
+        The sample count applies to the whole scan list, so channels averaged by
+        their profile are scanned separately, one scan per number of readings."""
+        self.scan_channels = {}
+        self.average_scans = {}
+        groups = {}
+        for channel, config in sorted(channelConfigs.items()):
+            function = self.scanFunction(config)
+            if function is None:
+                continue
+            profile = (profiles or {}).get(channel) or DEFAULT_PROFILE
+            # channel numbering starts at 100
+            if profile.averaged:
+                scan = self.average_scans.setdefault(profile.average, {})
+                scan[channel + 100] = config
+            else:
+                self.scan_channels[channel + 100] = config
+            groups.setdefault((function, profile), []).append(channel + 100)
+        if not groups:
+            return
+        # every CONF redefines the scan list, so the full list is set at the end
+        for (function, profile), channels in groups.items():
+            self.configChannels(function, channels, profile)
+        if self.scan_channels:
+            self.setScanList(self.scan_channels)
+        # a scan of many channels can take longer than a single reading
+        readings = len(self.scan_channels) + sum(
+            count * len(scan) for count, scan in self.average_scans.items()
+        )
+        self.device.timeout = max(10000, 1000 * readings)
+
+    def measureScan(self):
+        """Runs the configured scan list once and returns {channel: value} of all
+        channels, the Statistics of the averaged ones"""
+        results = {channel - 100: None for channel in self.scan_channels}
+        for scan in self.average_scans.values():
+            results.update({channel - 100: None for channel in scan})
+        try:
+            for count, scan in self.average_scans.items():
+                stats = self.readStatistics(list(scan), count)
+                valid = [ch for ch in scan if stats.get(ch) is not None]
+                converted = self.convertStatistics(
+                    [self.readingConfig(scan[ch]) for ch in valid],
+                    [stats[ch] for ch in valid],
+                )
+                for channel, value in zip(valid, converted):
+                    results[channel - 100] = value
+            if not self.scan_channels:
+                return results
+            self.setScanList(self.scan_channels)
+            self.setSampleCount(1)
+            self.device.write("INIT")
+            # the DAQ970A only sends ASCII readings, parsed into one array
+            readings = parse_ascii(self.device.query("FETC?"))
+        except (pyvisa.VisaIOError, ValueError) as e:
+            print(f"Keyseight DAQ970A scan error: {e}")
+            self.invalidateState()
+            return results
+        # readings are returned in ascending channel order of the scan list,
+        # all readings of a sensor type are converted at once (temperatures
+        # already come converted by the instrument)
+        channels = list(self.scan_channels)[: len(readings)]
+        configs = [self.readingConfig(self.scan_channels[ch]) for ch in channels]
+        values = convert_readings(configs, readings[: len(channels)])
+        for channel, value in zip(channels, values.tolist()):
+            results[channel - 100] = None if value != value else value
+        return results
+
+    def convertReading(self, config, value):
+        """Converts a raw scan reading into the value of the configured sensor"""
+        return convert_value(config, value)
+
+    def measureChannel(
+        self, config, channel, measRange=1000, measResolution=7, profile=None
+    ):
+        """closes one specific channel, configures it and measures the value, which is cleaned and returned
+        profile (range, NPLC, autozero, digits) of the channel, else the defaults;
+        channels averaged by their profile return the Statistics of the readings"""
         channel += 100  # channel numbering starts at 100
+        profile = profile or DEFAULT_PROFILE
         try:
             if config == "Voltage":
-                self.configVoltageDC(channel, measRange, measResolution)
+                self.configVoltageDC(channel, measRange, measResolution, profile)
             elif config == "Resistance":
-                self.configRes2W(channel, measRange, measResolution)
+                self.configRes2W(channel, measRange, measResolution, profile)
             elif config == "Current":
-                self.configCurrentDC(channel, measRange, measResolution)
+                self.configCurrentDC(channel, measRange, measResolution, profile)
             elif config == "Frequency":
-                self.configFreq(channel, measRange, measResolution)
+                self.configFreq(channel, measRange, measResolution, profile)
             elif config == "PT100":
-                return self.measurePt100(channel, measRange, measResolution)
+                return self.measurePt100(channel, measRange, measResolution, profile)
             elif config == "NTC_44006":
-                return self.measureNTC_44006(channel, measRange, measResolution)
+                return self.measureNTC_44006(
+                    channel, measRange, measResolution, profile
+                )
             elif config == "NTC_44007":
-                return self.measureNTC_44007(channel, measRange, measResolution)
-            time.sleep(self.aquisition_time)
-            return self.readValue()
-        except pyvisa.VisaIOError as e:
+                return self.measureNTC_44007(
+                    channel, measRange, measResolution, profile
+                )
+            elif config in SENSORS:
+                return self.measureSensor(config, channel, profile)
+            return self.readChannel(config, channel, profile)
+        except (pyvisa.VisaIOError, ValueError) as e:
             print(f"Keyseight DAQ970A measurement error: {e}")
+            self.invalidateState()
             return None
 
     # ---- Local used functions -----
-    def configVoltageDC(self, channel, measRange, measResolution):
+    def configVoltageDC(
+        self, channel, measRange, measResolution, profile=DEFAULT_PROFILE
+    ):
         """Configures the Meter to DC voltage
         Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        self.device.write(f"CONF:VOLT:DC (@{channel})")
+        measRange      -- not used, range and resolution come with the profile
+        profile        -- Profile (range, NPLC, autozero, digits) of the channel"""
+        self.configChannels("VOLT:DC", [channel], profile)
+        self.setScanList([channel])
 
-    def configRes2W(self, channel, measRange, measResolution):
+    def configRes2W(self, channel, measRange, measResolution, profile=DEFAULT_PROFILE):
         """Configures the Meter to 2 Wire Resistance
         Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        self.device.timeout = 10000  # Set timeout to 10 seconds
-        command = f"CONF:RES (@{channel})"
-        self.device.write(command)
+        measRange      -- not used, range and resolution come with the profile
+        profile        -- Profile (range, NPLC, autozero, digits) of the channel"""
+        self.ensureTimeout(10000)
+        self.configChannels("RES", [channel], profile)
+        self.setScanList([channel])
 
-    def configCurrentDC(self, channel, measRange, measResolution):
+    def configCurrentDC(
+        self, channel, measRange, measResolution, profile=DEFAULT_PROFILE
+    ):
         """Configures the Meter to DC current
         Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        self.device.write(f"CONF:CURR:DC (@{channel})")
+        measRange      -- not used, range and resolution come with the profile
+        profile        -- Profile (range, NPLC, autozero, digits) of the channel"""
+        self.configChannels("CURR:DC", [channel], profile)
+        self.setScanList([channel])
 
-    def configFreq(self, channel, measRange, measResolution):
+    def configFreq(self, channel, measRange, measResolution, profile=DEFAULT_PROFILE):
         """Configures the Meter to Frequency
         Arguments:
-        measRange      -- float measurement range [0.1, 1, 10, 100, 1000]
-        measResolution -- int measurement resolution in digit[4,5,6,7]"""
-        command = f"CONF:FREQ (@{channel})"
-        self.device.write(command)
+        measRange      -- not used, range and resolution come with the profile
+        profile        -- Profile (range, NPLC, autozero, digits) of the channel"""
+        self.configChannels("FREQ", [channel], profile)
+        self.setScanList([channel])
+
+    def readChannel(self, config, channel, profile=DEFAULT_PROFILE):
+        """Reads the configured channel, converted with the sensor of config.
+        READ? returns once the reading is done, the relays settle during the
+        channel delay of the instrument"""
+        config = self.readingConfig(config)
+        if profile.averaged:
+            stats = self.readStatistics([channel], profile.average)[channel]
+            if stats is None:
+                return None
+            return self.convertStatistics([config], [stats])[0]
+        self.setSampleCount(1)
+        return convert_value(config, self.readValue())
+
+    def measureSensor(self, config, channel, profile=DEFAULT_PROFILE):
+        """Configures the channel to the function of a sensor and returns its
+        value, temperatures are converted by the instrument if native"""
+        self.ensureTimeout(10000)
+        self.configChannels(self.scanFunction(config), [channel], profile)
+        self.setScanList([channel])
+        return self.readChannel(config, channel, profile)
+
+    def measurePt100(self, channel, measRange, measResolution, profile=DEFAULT_PROFILE):
+        """Measures the temperature of a PT100, with CONF:TEMP RTD,91 if native"""
+        return self.measureSensor("PT100", channel, profile)
+
+    def measureNTC_44006(
+        self, channel, measRange, measResolution, profile=DEFAULT_PROFILE
+    ):
+        """Measures the temperature of a 10 kOhm NTC thermistor, with
+        CONF:TEMP THER,10000 if native"""
+        return self.measureSensor("NTC_44006", channel, profile)
 
-    def measurePt100(self, measRange, measResolution):
-        """Configures the Meter to PT100 temperature measurement"""
-        self.configRes2W(measRange, measResolution)
-        resistance = self.readValue()
-        # t=(-AR_0+srt((AR_0)^2-4BR_0(R_0-R)))/2BR_0
-        A = 3.9827e-3
-        B = -5.875e-7
-        R_0 = 100.0  # PT100 resistance at 0°C
-        temperature = (
-            -A * R_0 + (A**2 * R_0**2 - 4 * B * R_0 * (R_0 - resistance)) ** 0.5
-        ) / (2 * B * R_0)
-        return temperature
-
-    def measureNTC_44006(self, measRange, measResolution):
-        """Calculate temperature from NTC thermistor resistance using Steinhart-Hart equation."""
-        self.configRes2W(measRange, measResolution)
-        resistance = self.readValue()
-        A = 1.032e-3
-        B = 2.387e-4
-        C = 1.580e-7
-        log_resistance = math.log(resistance)
-        inv_temp = A + B * log_resistance + C * log_resistance**3
-        temperature_kelvin = 1 / inv_temp
-        temperature_celsius = temperature_kelvin - 273.15
-        return temperature_celsius
-
-    def measureNTC_44007(self, measRange, measResolution):
-        """Calculate temperature from NTC thermistor resistance using Steinhart-Hart equation."""
-        self.configRes2W(measRange, measResolution)
-        resistance = self.readValue()
-        A = 1.285e-3
-        B = 2.362e-4
-        C = 9.285e-8
-        log_resistance = math.log(resistance)
-        inv_temp = A + B * log_resistance + C * log_resistance**3
-        temperature_kelvin = 1 / inv_temp
-        temperature_celsius = temperature_kelvin - 273.15
-        return temperature_celsius
+    def measureNTC_44007(
+        self, channel, measRange, measResolution, profile=DEFAULT_PROFILE
+    ):
+        """Measures the temperature of a 5 kOhm NTC thermistor, with
+        CONF:TEMP THER,5000 if native"""
+        return self.measureSensor("NTC_44007", channel, profile)
 
     def close(self):
         self.device.close()
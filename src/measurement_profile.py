@@ -0,0 +1,88 @@
+"""Per-channel speed/precision settings of a measurement.
+
+A profile holds the range, integration time (NPLC, or the gate time of
+frequency channels), autozero, digits and number of averaged readings a channel
+is measured with. They are read from the optional columns range, nplc,
+aperture, autozero, digits and average of the channel config CSV; empty fields
+keep the driver's default for the channel (e.g. the fixed 10 V range and 5
+digits of Keithley voltage channels, one reading), a range of "auto" selects
+autorange. Fast channels can e.g. run at 0.1 NPLC with a fixed range while
+precision thermistors stay at 10 NPLC.
+"""
+
+from typing import Mapping, NamedTuple, Optional
+
+COLUMNS = ("range", "nplc", "aperture", "autozero", "digits", "average")
+MAX_AVERAGE = 1024  # readings per value, limited by the Keithley's buffer
+AUTORANGE = 0.0  # range of "auto", None keeps the driver's default range
+
+
+class Profile(NamedTuple):
+    range: Optional[float] = None  # AUTORANGE: autorange, None: driver default
+    nplc: Optional[float] = None  # integration time in power line cycles
+    aperture: Optional[float] = None  # gate time of frequency channels in s
+    autozero: Optional[bool] = None
+    digits: Optional[int] = None  # 4..7 (3.5 to 6.5 digits)
+    # readings taken by the instrument in one trigger, stored with their statistics
+    average: Optional[int] = None
+
+    @property
+    def averaged(self) -> bool:
+        return (self.average or 1) > 1
+
+    def __str__(self):
+        return " ".join(
+            f"{name}={'auto' if name == 'range' and value == AUTORANGE else value}"
+            for name, value in self._asdict().items()
+            if value is not None
+        )
+
+    def merged(self, defaults: "Profile") -> "Profile":
+        """Profile with the unset fields taken from defaults."""
+        return Profile(
+            *(
+                default if value is None else value
+                for value, default in zip(self, defaults)
+            )
+        )
+
+
+DEFAULT_PROFILE = Profile()
+
+_TRUE = ("true", "1", "yes", "y", "on")
+_FALSE = ("false", "0", "no", "n", "off")
+
+
+def parse_profile(row: Mapping[str, Optional[str]]) -> Profile:
+    """Profile of a CSV row (or form), ValueError for invalid fields."""
+    values = {}
+    for name in COLUMNS:
+        value = (row.get(name) or "").strip().lower()
+        if name == "range" and value == "auto":
+            values[name] = AUTORANGE
+            continue
+        if value in ("", "auto", "def", "default"):
+            continue
+        if name == "autozero":
+            if value not in _TRUE + _FALSE:
+                raise ValueError(f"Invalid autozero: {value}")
+            values[name] = value in _TRUE
+        elif name == "digits":
+            values[name] = int(value)
+            if not 4 <= values[name] <= 7:
+                raise ValueError(f"Invalid digits: {value}")
+        elif name == "average":
+            values[name] = int(value)
+            if not 1 <= values[name] <= MAX_AVERAGE:
+                raise ValueError(f"Invalid average: {value}")
+        else:
+            values[name] = float(value)
+            if values[name] <= 0:
+                raise ValueError(f"Invalid {name}: {value}")
+    return Profile(**values)
+
+
+def setting_key(config: str, profile: Profile = DEFAULT_PROFILE) -> str:
+    """Measurement setting of a channel as used by the scan plan, e.g.
+    "Voltage" or "Voltage (range=10.0 nplc=0.1)"."""
+    return f"{config} ({profile})" if profile != DEFAULT_PROFILE else config
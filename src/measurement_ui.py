@@ -4,11 +4,14 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.ticker import FuncFormatter
 import matplotlib.pyplot as plt
 import pyvisa
-import time
 from datetime import datetime
 import csv
-from Keithley2000 import Keithley2000
+from Keithley2000 import MEAS_RANGE, MEAS_RESOLUTION, Keithley2000
 from keyseight_DAC970A import KeysightDAQ970A
+from downsampling import lttb
+from measurement_profile import DEFAULT_PROFILE, parse_profile
+from scan_scheduler import DeadlineTimer
+from simulated_instrument import SIM_ADDRESSES, is_simulated, open_simulated
 import os
 
 
@@ -40,13 +43,13 @@ class KeithleyCustomTkinterGUI:
         self.create_widgets(master)
 
     def get_instruments(self):
-        """Retrieve available instruments using PyVISA."""
+        """Retrieve available instruments using PyVISA, plus the simulated ones."""
         try:
             resources = self.rm.list_resources()
             print(f"Available instruments: {resources}")
-            return [res for res in resources]
+            return [res for res in resources] + SIM_ADDRESSES
         except pyvisa.VisaIOError:
-            return []
+            return list(SIM_ADDRESSES)
 
     def create_frames(self, master):
         """Create the main frames for the GUI."""
@@ -318,6 +321,10 @@ class KeithleyCustomTkinterGUI:
             os.path.dirname(os.path.abspath(__file__)), config_file
         )
         self.channel_configs = {}
+        # range, NPLC, autozero and digits columns of every channel
+        self.channel_profiles = {}
+        # temperature sensors converted by the instrument (nativeTemperature)
+        self.channel_native = {}
         if os.path.exists(self.config_file_path):
             with open(self.config_file_path, mode="r", newline="") as file:
                 reader = csv.DictReader(file)
@@ -330,6 +337,10 @@ class KeithleyCustomTkinterGUI:
                             "active": active,
                             "config": config,
                         }
+                        native = str(row.get("native") or "").strip().lower()
+                        native = native in ("true", "1", "yes", "y", "on")
+                        self.channel_native[ch] = native
+                        self.channel_profiles[ch] = parse_profile(row)
                     except Exception:
                         continue
         self.number_of_channels = max(self.channel_configs.keys())
@@ -356,7 +367,11 @@ class KeithleyCustomTkinterGUI:
         self.selected_instrument = self.instrument_var.get()
         if self.selected_instrument != "None":
             try:
-                self.instrument = self.rm.open_resource(self.selected_instrument)
+                if is_simulated(self.selected_instrument):
+                    self.instrument = open_simulated(self.selected_instrument)
+                    self.device_type_var.set(self.instrument.model)
+                else:
+                    self.instrument = self.rm.open_resource(self.selected_instrument)
                 idn_response = self.instrument.query("*IDN?")
                 messagebox.showinfo(
                     "Connected",
@@ -378,15 +393,28 @@ class KeithleyCustomTkinterGUI:
                 )
 
     def measure_and_plot(self):
-        start_time = time.time()
+        # fixed rate on absolute deadlines, the scan time does not add up
+        self.timer = DeadlineTimer(self.interval)
         while self.is_measuring:
+            self.timer.wait()
             full_timestamp = datetime.now()
             self.times.append(full_timestamp)
             for channel in range(1, self.number_of_channels + 1):
                 if self.channel_vars[channel].get():  # if channel is selected
                     config = self.channel_configs[channel].get()
-                    measurement = self.instrument.measureChannel(config, channel, 10, 5)
+                    if hasattr(self.instrument, "nativeTemperature"):
+                        native = self.channel_native.get(channel, False)
+                        self.instrument.nativeTemperature = (config,) if native else ()
+                    measurement = self.instrument.measureChannel(
+                        config,
+                        channel,
+                        MEAS_RANGE,
+                        MEAS_RESOLUTION,
+                        profile=self.channel_profiles.get(channel, DEFAULT_PROFILE),
+                    )
                     print(f"Channel {channel} measurement: {measurement}")
+                    # averaged channels are plotted with their mean
+                    measurement = getattr(measurement, "mean", measurement)
                     # Handle None values - replace with 0
                     if measurement is None:
                         # Use 0 if no previous measurements
@@ -399,7 +427,8 @@ class KeithleyCustomTkinterGUI:
             self.ax.set_title("Measurements Over Time")
             self.ax.set_xlabel("Time (HH:MM:SS)")
             self.ax.set_ylabel("Value")
-            # Plot data for each selected channel
+            # Plot data for each selected channel, downsampled to the canvas width
+            width = max(self.canvas.get_tk_widget().winfo_width(), 100)
             for channel in range(1, self.number_of_channels + 1):
                 if (
                     self.channel_vars[channel].get()
@@ -409,9 +438,10 @@ class KeithleyCustomTkinterGUI:
                         dt.timestamp()
                         for dt in self.times[: len(self.measurements[channel])]
                     ]
-                    self.ax.plot(
-                        times_plot, self.measurements[channel], label=f"CH{channel}"
+                    times_plot, values_plot = lttb(
+                        times_plot, self.measurements[channel], 2 * width
                     )
+                    self.ax.plot(times_plot, values_plot, label=f"CH{channel}")
             if any(
                 self.channel_vars[channel].get()
                 for channel in range(1, self.number_of_channels + 1)
@@ -431,7 +461,7 @@ class KeithleyCustomTkinterGUI:
                 text=f"Latest Measurements: {latest_measurements}"
             )
             self.master.update()
-            time.sleep(self.interval)
+            self.timer.done()
 
     def start_measurement(self):
         if hasattr(self, "instrument"):
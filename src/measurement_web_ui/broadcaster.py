@@ -0,0 +1,46 @@
+import queue
+import threading
+from typing import List
+
+# Sent instead of the dropped messages when a subscriber fell behind
+RESYNC = {"event": "resync"}
+
+
+class Broadcaster:
+    """Fan-out of published messages to any number of subscribers.
+
+    Every subscriber gets its own bounded queue. publish() never blocks: if a
+    slow consumer's queue is full, its backlog is dropped and replaced by a
+    RESYNC message, so the acquisition thread is never stalled by a client.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers: List[queue.Queue] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, message: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(RESYNC)
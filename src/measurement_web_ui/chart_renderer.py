@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+class ChartRenderer:
+    """Renders the chart PNG in a background thread and caches the results.
+
+    A single worker thread owns one persistent figure; the lines of the
+    channels are kept and only get new data with set_data. Rendered images are
+    cached per key (data version, size and range), so repeated requests return
+    the cached bytes and concurrent requests for the same key share one render.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+        # only touched by the worker thread
+        self._fig: Optional[Figure] = None
+        self._ax = None
+        self._lines: Dict[int, object] = {}
+
+    def render(
+        self,
+        key: Hashable,
+        width: int,
+        capture: Callable[[], Callable[[], Tuple[np.ndarray, np.ndarray]]],
+        channels: Sequence[Tuple[int, str]],
+    ) -> bytes:
+        """PNG bytes for key, rendered in the worker if not cached yet.
+
+        capture() is called in the worker and returns a function producing the
+        (times_ns, values) to plot; channels lists (channel, label) of the lines.
+        """
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                return data
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(
+                    self._render_job, key, width, capture, channels
+                )
+                self._pending[key] = future
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    # ---- worker thread -----
+    def _render_job(self, key, width, capture, channels) -> bytes:
+        try:
+            times_ns, values = capture()()
+            data = self._draw(width, times_ns, values, channels)
+            with self._lock:
+                self._cache[key] = data
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            return data
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _figure(self, width: int):
+        if self._fig is None:
+            self._fig = Figure(figsize=(width / 100, 4), dpi=100)
+            FigureCanvasAgg(self._fig)
+            self._ax = self._fig.add_subplot()
+            self._ax.set_title("Measurements Over Time")
+            self._ax.set_xlabel("Time (s)")
+            self._ax.set_ylabel("Value")
+        elif self._fig.get_figwidth() != width / 100:
+            self._fig.set_size_inches(width / 100, 4)
+        return self._fig, self._ax
+
+    def _draw(self, width, times_ns, values, channels) -> bytes:
+        fig, ax = self._figure(width)
+        # convert times to seconds since the first plotted sample
+        xt = (times_ns - times_ns[0]) / 1e9 if len(times_ns) else times_ns
+        plotted = set()
+        for ch, label in channels:
+            if not len(xt) or ch > values.shape[1]:
+                continue
+            ys = values[:, ch - 1]
+            valid = ~np.isnan(ys)
+            if not valid.any():
+                continue
+            line = self._lines.get(ch)
+            if line is None:
+                # fixed colour per channel, independent of the other lines
+                (line,) = ax.plot([], [], color=f"C{(ch - 1) % 10}")
+                self._lines[ch] = line
+            line.set_data(xt[valid], ys[valid])
+            line.set_label(label)
+            plotted.add(ch)
+        for ch in set(self._lines) - plotted:
+            self._lines.pop(ch).remove()
+        ax.relim()
+        ax.autoscale_view()
+        if plotted:
+            ax.legend(handles=[self._lines[ch] for ch in sorted(plotted)], loc="best")
+        elif ax.get_legend() is not None:
+            ax.get_legend().remove()
+        fig.tight_layout()
+        buf = BytesIO()
+        fig.savefig(buf, format="png")
+        return buf.getvalue()
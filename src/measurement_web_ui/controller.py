@@ -1,21 +1,39 @@
 import threading
 import time
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from io import BytesIO, StringIO
-from typing import Dict, List, Optional
+from io import StringIO
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
+import numpy as np
 import matplotlib
 
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 
 import pyvisa
 
 # Local instrument drivers
-from Keithley2000 import Keithley2000
+from Keithley2000 import MEAS_RANGE, MEAS_RESOLUTION, Keithley2000
 from keyseight_DAC970A import KeysightDAQ970A
+from downsampling import MinMaxAccumulator
+from measurement_profile import DEFAULT_PROFILE, Profile, parse_profile, setting_key
+from metrics import Counter, Gauge, Histogram, MeteredResource, TimedLock
+from scan_plan import ScanPlan, compile_plan
+from scan_scheduler import ChannelScheduler, TimingStats
+from scpi_readings import Statistics
+from sensor_conversions import (
+    TEMPERATURE,
+    convert_readings,
+    convert_statistics,
+    raw_config,
+)
+from simulated_instrument import SIM_ADDRESSES, is_simulated, open_simulated
+from .broadcaster import Broadcaster, RESYNC
+from .chart_renderer import ChartRenderer
+from .run_log import RunLog
+from .sample_store import STAT_COLUMNS, SampleStore
 import os
 
 
@@ -30,11 +48,52 @@ CHANNEL_OPTIONS = [
     "IKR020",
 ]
 
+# Prometheus metrics of the acquisition, exposed at /metrics
+CHANNEL_SECONDS = Histogram(
+    "outgassing_channel_measure_seconds",
+    "Time to configure and read one channel in sequential mode.",
+    ["instrument", "channel"],
+)
+CHANNEL_ERRORS = Counter(
+    "outgassing_channel_errors_total",
+    "Failed readings (VISA errors, timeouts, missing values) per channel.",
+    ["instrument", "channel"],
+)
+PHASE_SECONDS = Histogram(
+    "outgassing_scan_phase_seconds",
+    "Time of the scan list configuration and of the scan readout per instrument.",
+    ["instrument", "phase"],
+)
+CYCLE_SECONDS = Histogram(
+    "outgassing_scan_cycle_seconds",
+    "Duration of one acquisition cycle over all instruments.",
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "outgassing_lock_wait_seconds",
+    "Time spent waiting for the controller lock.",
+    buckets=(1e-6, 1e-5, 1e-4, 0.001, 0.01, 0.1, 1.0),
+)
+RECONFIGURATIONS = Gauge(
+    "outgassing_scan_reconfigurations",
+    "Setting changes per cycle of the channels read one by one, with the scan "
+    "plan and in channel order.",
+    ["instrument", "order"],
+)
+STORE_ROWS = Gauge("outgassing_store_rows", "Rows in the sample store.")
+STORE_MEMORY = Gauge(
+    "outgassing_store_memory_bytes", "Memory used by the sample store."
+)
+
 
 class MeasurementController:
-    def __init__(self):
+    def __init__(self, run_log_path: Optional[str] = None):
+        """run_log_path -- SQLite run log to use instead of data/run_log.sqlite,
+        the last unfinished run is only recovered from the default one"""
         self.rm = pyvisa.ResourceManager()
-        self.instrument = None
+        # Connected drivers by address, every one is read by its own worker thread
+        self.instruments: Dict[str, object] = {}
+        self.instrument_types: Dict[str, str] = {}
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
         self.instrument_addr: Optional[str] = None
         self.device_type: str = ""
         self.device_types: List[str] = ["Keithley2000", "KeysightDAQ970A"]
@@ -47,59 +106,144 @@ class MeasurementController:
         self.channel_active: Dict[int, bool] = {}
         self.channel_config: Dict[int, str] = {}
         self.channel_name: Dict[int, str] = {}
+        # Instrument (address or model, "" for the first connected one) and its
+        # own channel number measuring every channel
+        self.channel_instrument: Dict[int, str] = {}
+        self.channel_local: Dict[int, int] = {}
+        # Seconds between two readings of a channel, None for the global interval
+        self.channel_interval: Dict[int, Optional[float]] = {}
+        # Range, NPLC/aperture, autozero and digits every channel is measured with
+        self.channel_profile: Dict[int, Profile] = {}
+        # Temperature sensors converted by the instrument (native column)
+        self.channel_native: Dict[int, bool] = {}
+        # (address, local ch, ch) of channels dropped from the routes because an
+        # earlier channel is measured by the same input, reported once
+        self._route_conflicts: set = set()
 
         self.interval: float = 1.0
+        # Use the instrument's hardware scan list (one INIT/FETCh? per cycle) if supported
+        self.scan_mode: bool = True
+        self._scan_signatures: Dict[str, tuple] = {}
+        # Execution plan of the channels read one by one and the setting the
+        # instrument was left in, per address
+        self.scan_plans: Dict[str, ScanPlan] = {}
+        self._plan_settings: Dict[str, str] = {}
+        # Scan duration, lateness/jitter and overruns of the acquisition loop
+        self.timing = TimingStats()
         self.is_measuring: bool = False
         self._thread: Optional[threading.Thread] = None
-        self._lock = threading.Lock()
-
-        self.times: List[datetime] = []
-        self.measurements: Dict[int, List[float]] = {
-            i: [] for i in range(1, self.number_of_channels + 1)
-        }
+        self._lock = TimedLock(LOCK_WAIT_SECONDS)
+
+        # Newest rows kept in memory, older rows are spilled to disk
+        self.sample_window: int = 100_000
+        self.store = SampleStore(self.number_of_channels, window=self.sample_window)
+        # Pushes every completed scan to the live stream subscribers
+        self.broadcaster = Broadcaster()
+        # Renders /chart.png off the lock and caches it per data version
+        self.chart_renderer = ChartRenderer()
+        STORE_ROWS.set_function(lambda: len(self.store))
+        STORE_MEMORY.set_function(lambda: self.store.memory_bytes())
 
         # initialize channel configs
         self.load_channel_configs(self.config_file)
 
+        # Durable log of every scan, an unfinished run is reopened on restart
+        self.run_log_path: str = run_log_path or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "data",
+            "run_log.sqlite",
+        )
+        self.run_log = RunLog(self.run_log_path)
+        if run_log_path is None:
+            self._recover_run()
+
     def list_instruments(self) -> List[str]:
+        """VISA resources and the simulated instruments for offline testing."""
         try:
-            return list(self.rm.list_resources())
+            resources = list(self.rm.list_resources())
         except Exception:
-            return []
+            resources = []
+        return resources + SIM_ADDRESSES
+
+    @property
+    def instrument(self):
+        """The first connected instrument, it measures all unassigned channels."""
+        return next(iter(self.instruments.values()), None)
 
     def connect(self, device_type: str, address: str) -> str:
+        """Connect an instrument in addition to the already connected ones.
+
+        Simulated instruments (SIM::<model>::INSTR) always use the driver of
+        their model.
+        """
+        if is_simulated(address):
+            inst = open_simulated(address)
+            device_type = inst.model
         self.device_type = device_type
         self.instrument_addr = address
-        self.close()
-        inst = self.rm.open_resource(address)
+        self.disconnect(address)
+        if not is_simulated(address):
+            inst = self.rm.open_resource(address)
+        # records the round-trip time and errors of every command
+        inst = MeteredResource(inst, address)
         idn = inst.query("*IDN?")
         if device_type == "Keithley2000":
-            self.instrument = Keithley2000(inst)
+            instrument = Keithley2000(inst)
         elif device_type == "KeysightDAQ970A":
-            self.instrument = KeysightDAQ970A(inst)
+            instrument = KeysightDAQ970A(inst)
         else:
             return "unknown"
         # 10s timeout
-        self.instrument.timeout = 10000
+        instrument.timeout = 10000
         # Initialize
-        self.instrument.init()
+        instrument.init()
+        self.instruments[address] = instrument
+        self.instrument_types[address] = device_type
+        self._executors[address] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"instrument-{address}"
+        )
         return idn
 
-    def close(self):
+    def disconnect(self, address: str):
+        instrument = self.instruments.pop(address, None)
+        self.instrument_types.pop(address, None)
+        self._scan_signatures.pop(address, None)
+        executor = self._executors.pop(address, None)
+        if executor is not None:
+            # let a running measurement finish before the session is closed
+            executor.shutdown(wait=True)
         try:
-            if self.instrument:
-                self.instrument.close()
+            if instrument:
+                instrument.close()
         except Exception:
             pass
-        self.instrument = None
+
+    def close(self):
+        for address in list(self.instruments):
+            self.disconnect(address)
 
     def load_channel_configs(self, config_file: str):
         """Load channel configuration from a CSV.
 
-        Expected columns: channel_nr, configuration, active, (optional) name
-        Active is interpreted case-insensitively: true/false, 1/0, yes/no, on/off.
+        Expected columns: channel_nr, configuration, active, (optional) name,
+        (optional) instrument, instrument_channel, interval and range, nplc,
+        aperture, autozero, digits, average. channel_nr is the column in the sample store;
+        instrument (address or model) and instrument_channel select the input
+        measuring it, by default the channel of the same number of the first
+        connected instrument. interval is the time between two readings of the
+        channel in seconds, by default the global measurement interval. The
+        profile columns set the speed/precision of the channel (empty: autorange
+        and the driver's default NPLC, autozero and digits; average is the
+        number of readings averaged on the instrument, one by default).
+        native (optional) measures a PT100/NTC channel as a temperature on
+        instruments converting it themselves (DAQ970A) instead of as a resistance
+        converted here; its run log then cannot be reprocessed.
+        Active and native are interpreted case-insensitively: true/false, 1/0,
+        yes/no, on/off.
         Gaps in channel numbering are filled with default inactive entries so that
-        UI renders a contiguous block from 1..max_channel.
+        UI renders a contiguous block from 1..max_channel. An active channel
+        measured by the same instrument and instrument_channel as an earlier one
+        is deactivated.
         """
         src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         path = os.path.join(src_dir, config_file)
@@ -110,6 +254,11 @@ class MeasurementController:
         ch_active: Dict[int, bool] = {}
         ch_config: Dict[int, str] = {}
         ch_name: Dict[int, str] = {}
+        ch_instrument: Dict[int, str] = {}
+        ch_local: Dict[int, int] = {}
+        ch_interval: Dict[int, Optional[float]] = {}
+        ch_profile: Dict[int, Profile] = {}
+        ch_native: Dict[int, bool] = {}
 
         if os.path.exists(path):
             with open(path, mode="r", newline="") as f:
@@ -125,6 +274,16 @@ class MeasurementController:
                         ch_active[ch] = active_bool
                         ch_config[ch] = row.get("configuration", "None") or "None"
                         ch_name[ch] = row.get("name", f"CH{ch}") or f"CH{ch}"
+                        ch_instrument[ch] = (row.get("instrument") or "").strip()
+                        ch_local[ch] = int(row.get("instrument_channel") or ch)
+                        raw_native = str(row.get("native") or "").strip().lower()
+                        ch_native[ch] = raw_native in ("true", "1", "yes", "y", "on")
+                        raw_interval = row.get("interval")
+                        ch_interval[ch] = float(raw_interval) if raw_interval else None
+                        try:
+                            ch_profile[ch] = parse_profile(row)
+                        except ValueError as e:
+                            print(f"{config_file} channel {ch}: {e}, using defaults")
                     except Exception:
                         continue
         # Determine max channel even if there are gaps
@@ -138,14 +297,28 @@ class MeasurementController:
                 i, self.channel_config.get(i, "None")
             )
             self.channel_name[i] = ch_name.get(i, self.channel_name.get(i, f"CH{i}"))
-        # Resize measurements dict preserving existing collected data
+            self.channel_instrument[i] = ch_instrument.get(i, "")
+            self.channel_local[i] = ch_local.get(i, i)
+            self.channel_interval[i] = ch_interval.get(i)
+            self.channel_profile[i] = ch_profile.get(i, DEFAULT_PROFILE)
+            self.channel_native[i] = ch_native.get(i, False)
+        inputs: Dict[tuple, int] = {}
         for i in range(1, self.number_of_channels + 1):
-            if i not in self.measurements:
-                self.measurements[i] = []
-        # Drop measurements for channels beyond new max (unlikely shrinking case)
-        for ch in list(self.measurements.keys()):
-            if ch > self.number_of_channels:
-                del self.measurements[ch]
+            if not self.channel_active[i]:
+                continue
+            key = (self.channel_instrument[i], self.channel_local[i])
+            if key in inputs:
+                print(
+                    f"{config_file} channel {i}: instrument_channel {key[1]} is "
+                    f"already measured by channel {inputs[key]}, deactivated"
+                )
+                self.channel_active[i] = False
+            else:
+                inputs[key] = i
+        self._route_conflicts.clear()
+        # Resize the sample store preserving existing collected data
+        with self._lock:
+            self.store.resize(self.number_of_channels)
 
     def set_channels_from_form(self, form: dict):
         for i in range(1, self.number_of_channels + 1):
@@ -156,6 +329,15 @@ class MeasurementController:
             self.channel_name[i] = form.get(
                 f"name_{i}", self.channel_name.get(i, f"CH{i}")
             )
+            self.channel_instrument[i] = form.get(
+                f"instrument_{i}", self.channel_instrument.get(i, "")
+            )
+            if f"interval_{i}" in form:
+                try:
+                    interval = float(form.get(f"interval_{i}") or 0)
+                except ValueError:
+                    interval = 0
+                self.channel_interval[i] = interval if interval > 0 else None
 
     def list_config_files(self) -> List[str]:
         src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -174,11 +356,12 @@ class MeasurementController:
     def start(self):
         if self.is_measuring:
             return
-        if not self.instrument:
+        if not self.instruments:
             raise RuntimeError("No instrument connected")
         if not self.has_active_channels():
             raise RuntimeError("No active channels selected")
         self.is_measuring = True
+        self.timing.reset()
         self._thread = threading.Thread(target=self._run_loop, daemon=True)
         self._thread.start()
 
@@ -189,44 +372,362 @@ class MeasurementController:
 
     def clear(self):
         with self._lock:
-            self.times = []
-            self.measurements = {i: [] for i in range(1, self.number_of_channels + 1)}
+            finished_run = self.store.run_id
+            self.store.clear()
+        self.run_log.close_run(finished_run)
+        self.broadcaster.publish(RESYNC)
+
+    def _recover_run(self):
+        """Reload the last unfinished run from the run log and continue it."""
+        run_id = self.run_log.last_open_run()
+        if run_id is None:
+            return
+        self._load_run(run_id)
+
+    def _load_run(self, run_id: str):
+        """Replace the store's rows by the rows of a run in the run log."""
+        with self._lock:
+            self.store.clear()
+            self.store.run_id = run_id
+            for times_ns, values, stats in self.run_log.iter_samples(run_id):
+                self.store.extend(times_ns, values, stats)
+        self.chart_renderer.clear()
+        self.broadcaster.publish(RESYNC)
+
+    def reprocess(self, run_id: Optional[str] = None) -> int:
+        """Recompute the values of a run (the current one by default) from its
+        raw readings with the current sensor coefficients.
+
+        Returns the number of recomputed rows. The current run can only be
+        reprocessed while no measurement is running.
+        """
+        run_id = run_id or self.store.run_id
+        current = run_id == self.store.run_id
+        running = self.is_measuring or (self._thread and self._thread.is_alive())
+        if current and running:
+            raise RuntimeError("Stop the measurement before reprocessing its run")
+        rows = self.run_log.reprocess(run_id)
+        if current:
+            self._load_run(run_id)
+        return rows
 
     def _run_loop(self):
+        """Measure the due channels on absolute monotonic deadlines.
+
+        Sleeping until the next deadline instead of for a fixed interval after
+        the scan keeps the period from drifting by the scan time. Deadlines
+        missed during a slow scan are not caught up but measured once.
+        """
+        scheduler = ChannelScheduler()
         while self.is_measuring:
             try:
-                ts = datetime.now()
-                with self._lock:
-                    self.times.append(ts)
-                for ch in range(1, self.number_of_channels + 1):
-                    if self.channel_active.get(ch):
-                        config = self.channel_config.get(ch, "None")
-                        try:
-                            val = self.instrument.measureChannel(config, ch, 10, 5)
-                        except Exception:
-                            val = None
-                        if val is None:
-                            val = 0.0
-                        with self._lock:
-                            self.measurements[ch].append(val)
-                time.sleep(self.interval)
+                scheduler.configure(self._channel_intervals(), time.monotonic())
+                deadline = scheduler.next_due()
+                started = time.monotonic()
+                dropped = scheduler.dropped
+                # only the channels whose interval elapsed are measured
+                due = scheduler.due(started)
+                if due:
+                    self._measure_cycle(due)
+                    finished = time.monotonic()
+                    next_due = scheduler.next_due()
+                    self.timing.record(
+                        deadline,
+                        started,
+                        finished,
+                        overrun=next_due is not None and finished > next_due,
+                        dropped_readings=scheduler.dropped - dropped,
+                    )
+                next_due = scheduler.next_due()
+                wait = (
+                    self.interval if next_due is None else next_due - time.monotonic()
+                )
+                # wake up at least every interval to pick up configuration changes
+                time.sleep(min(max(wait, 0.0), self.interval))
             except Exception:
                 time.sleep(self.interval)
 
-    def get_state(self) -> dict:
+    def _measure_cycle(self, channels: Iterable[int]):
+        # one timestamp for the whole cycle, all instruments start at once
+        ts_ns = time.time_ns()
+        with CYCLE_SECONDS.time():
+            values, raw, sensors, stats, raw_stats = self._measure_all(channels)
         with self._lock:
-            latest = {
-                ch: (vals[-1] if vals else None)
-                for ch, vals in self.measurements.items()
+            seq = self.store.append(ts_ns, values, stats)
+            run_id = self.store.run_id
+            number_of_channels = self.store.number_of_channels
+        # written to disk by the run log's own thread, with the raw readings so
+        # the values can be reprocessed later
+        self.run_log.append(
+            run_id,
+            seq,
+            ts_ns,
+            values,
+            number_of_channels,
+            raw=raw,
+            sensors=sensors,
+            stats=stats,
+            raw_stats=raw_stats,
+        )
+        message = {
+            "seq": seq,
+            "run": run_id,
+            "time": datetime.fromtimestamp(ts_ns / 1e9).isoformat(),
+            "values": values,
+        }
+        if stats:
+            message["stats"] = {
+                ch: dict(zip(STAT_COLUMNS, stat)) for ch, stat in stats.items()
+            }
+        self.broadcaster.publish(message)
+
+    def _channel_intervals(self) -> Dict[int, float]:
+        """Reading interval in seconds of every active channel."""
+        return {
+            ch: self.channel_interval.get(ch) or self.interval
+            for ch in range(1, self.number_of_channels + 1)
+            if self.channel_active.get(ch)
+        }
+
+    def resolve_instrument(self, ref: str) -> Optional[str]:
+        """Address of the connected instrument given by address or model name."""
+        if not ref:
+            return next(iter(self.instruments), None)
+        if ref in self.instruments:
+            return ref
+        for address, device_type in self.instrument_types.items():
+            if device_type == ref:
+                return address
+        return None
+
+    def _channel_routes(
+        self, channels: Optional[Iterable[int]] = None
+    ) -> Dict[str, Dict[int, tuple]]:
+        """Active channels per instrument address as {local ch: (ch, config)}.
+
+        channels limits the result to these channels. Channels assigned to an
+        instrument that is not connected are skipped, as are channels whose
+        input is already routed to a lower channel (e.g. the default instrument
+        given once by address and once left empty); they are logged once.
+        """
+        if channels is None:
+            channels = range(1, self.number_of_channels + 1)
+        routes: Dict[str, Dict[int, tuple]] = {}
+        for ch in channels:
+            if not self.channel_active.get(ch):
+                continue
+            address = self.resolve_instrument(self.channel_instrument.get(ch, ""))
+            if address is None:
+                continue
+            local = self.channel_local.get(ch) or ch
+            config = self.channel_config.get(ch, "None")
+            inputs = routes.setdefault(address, {})
+            if local in inputs:
+                if (address, local, ch) not in self._route_conflicts:
+                    self._route_conflicts.add((address, local, ch))
+                    print(
+                        f"Channel {ch} skipped: {address} channel {local} is "
+                        f"already measured by channel {inputs[local][0]}"
+                    )
+                continue
+            inputs[local] = (ch, config)
+        return routes
+
+    def _measure_all(self, channels: Optional[Iterable[int]] = None) -> tuple:
+        """Measure all instruments in parallel and merge them into store channels.
+
+        Every instrument is read by its own single worker thread, so a cycle
+        takes as long as the slowest instrument. channels limits the cycle to
+        these channels (all active ones by default).
+
+        The instruments only measure the raw signals (resistance, voltage),
+        which are converted into sensor values here in one vectorized call.
+        Sensors of native channels the instrument converts itself
+        (TEMPERATURE_TRANSDUCERS, e.g. the RTDs and thermistors of the DAQ970A)
+        are measured as such and recorded with the configuration "Temperature",
+        which is stored unconverted.
+        Channels averaged on the instrument are read as Statistics; their mean
+        is the value and raw reading.
+        Returns ({ch: value}, {ch: raw reading}, {ch: configuration},
+        {ch: (std, min, max)} of the averaged channels, {ch: raw (std, min,
+        max)}); failed readings and readings that cannot be converted are None.
+        """
+        routes = self._channel_routes(channels)
+        futures = {}
+        native = {}
+        for address, channels in routes.items():
+            instrument = self.instruments.get(address)
+            transducers = getattr(instrument, "TEMPERATURE_TRANSDUCERS", {})
+            native[address] = {
+                local
+                for local, (ch, config) in channels.items()
+                if self.channel_native.get(ch) and config in transducers
+            }
+            if transducers:
+                # the other channels of the same sensors get their raw function
+                instrument.nativeTemperature = tuple(
+                    sorted({channels[local][1] for local in native[address]})
+                )
+            configs = {
+                local: config if local in native[address] else raw_config(config)
+                for local, (_, config) in channels.items()
             }
-            times = [t.strftime("%H:%M:%S") for t in self.times]
+            profiles = {
+                local: self.channel_profile.get(ch, DEFAULT_PROFILE)
+                for local, (ch, _) in channels.items()
+            }
+            try:
+                futures[address] = self._executors[address].submit(
+                    self._measure_instrument, address, configs, profiles
+                )
+            except (KeyError, RuntimeError):
+                # disconnected in the meantime
+                continue
+        raw = {}
+        sensors = {}
+        raw_stats = {}
+        for address, channels in routes.items():
+            try:
+                local_values = futures[address].result()
+            except Exception:
+                local_values = {}
+            for local, (ch, config) in channels.items():
+                reading = local_values.get(local)
+                if isinstance(reading, Statistics):
+                    raw_stats[ch] = reading[:4]
+                    reading = reading.mean
+                raw[ch] = reading
+                sensors[ch] = TEMPERATURE if local in native[address] else config
+        converted = convert_readings(list(sensors.values()), list(raw.values()))
+        values = {
+            ch: None if val != val else val for ch, val in zip(raw, converted.tolist())
+        }
+        stats = {}
+        if raw_stats:
+            converted = convert_statistics(
+                [sensors[ch] for ch in raw_stats], list(raw_stats.values())
+            )
+            for ch, row in zip(raw_stats, converted.tolist()):
+                if values[ch] is not None:
+                    stats[ch] = tuple(None if v != v else v for v in row[1:])
+        raw_stats = {ch: tuple(stat[1:]) for ch, stat in raw_stats.items()}
+        return values, raw, sensors, stats, raw_stats
+
+    def _measure_instrument(
+        self, address: str, configs: Dict[int, str], profiles: Dict[int, Profile]
+    ) -> Dict[int, Optional[float]]:
+        instrument = self.instruments[address]
+        if self.scan_mode and hasattr(instrument, "measureScan"):
+            return self._measure_scan(address, instrument, configs, profiles)
+        return self._measure_channels(address, instrument, configs, profiles)
+
+    def _measure_channels(
+        self,
+        address: str,
+        instrument,
+        configs: Dict[int, str],
+        profiles: Dict[int, Profile],
+    ) -> Dict[int, Optional[float]]:
+        """Measure the given channels of an instrument one after the other.
+
+        The channels are read in the order of the scan plan, grouped by their
+        configuration and profile and starting with the setting the instrument
+        is still in.
+        """
+        plan = compile_plan(
+            tuple(
+                (ch, setting_key(config, profiles[ch]))
+                for ch, config in configs.items()
+            )
+        )
+        self._report_plan(address, plan)
+        values = {}
+        for ch, setting in plan.order(self._plan_settings.get(address)):
+            self._plan_settings[address] = setting
+            started = time.perf_counter()
+            try:
+                val = instrument.measureChannel(
+                    configs[ch], ch, MEAS_RANGE, MEAS_RESOLUTION, profile=profiles[ch]
+                )
+            except Exception:
+                val = None
+            CHANNEL_SECONDS.labels(address, ch).observe(time.perf_counter() - started)
+            if val is None:
+                CHANNEL_ERRORS.labels(address, ch).inc()
+            values[ch] = val
+        return values
+
+    def _measure_scan(
+        self,
+        address: str,
+        instrument,
+        configs: Dict[int, str],
+        profiles: Dict[int, Profile],
+    ) -> Dict[int, Optional[float]]:
+        """Measure the given channels of an instrument with one hardware scan.
+
+        The scan list is only (re)configured when the channels or their
+        configurations changed since the last cycle.
+        """
+        signature = (tuple(configs.items()), tuple(profiles.items()))
+        try:
+            if signature != self._scan_signatures.get(address):
+                with PHASE_SECONDS.labels(address, "config").time():
+                    instrument.configureScan(
+                        configs, MEAS_RANGE, MEAS_RESOLUTION, profiles=profiles
+                    )
+                self._scan_signatures[address] = signature
+            with PHASE_SECONDS.labels(address, "read").time():
+                values = instrument.measureScan()
+            # drivers that read (some) channels one by one report their plan
+            plan = getattr(instrument, "scanPlan", None)
+            if plan is not None:
+                self._report_plan(address, plan)
+        except Exception:
+            # force a reconfiguration of the scan list in the next cycle
+            self._scan_signatures.pop(address, None)
+            values = {}
+        for ch in configs:
+            if values.get(ch) is None:
+                CHANNEL_ERRORS.labels(address, ch).inc()
+                values[ch] = None
+        return values
+
+    def _report_plan(self, address: str, plan: ScanPlan):
+        self.scan_plans[address] = plan
+        RECONFIGURATIONS.labels(address, "plan").set(plan.reconfigurations)
+        RECONFIGURATIONS.labels(address, "channel").set(plan.channel_order)
+
+    def plan_summary(self) -> dict:
+        """Scan plan of every instrument measured in the last cycles."""
+        return {
+            address: plan.summary()
+            for address, plan in list(self.scan_plans.items())
+            if address in self.instruments
+        }
+
+    def get_state(self) -> dict:
+        with self._lock:
+            latest = self.store.latest()
+            times_ns, _ = self.store.tail(500)
+            times = [
+                datetime.fromtimestamp(t / 1e9).strftime("%H:%M:%S")
+                for t in times_ns.tolist()
+            ]
             return {
                 "is_measuring": self.is_measuring,
                 "times": times,
                 "latest": latest,
+                "latest_stats": self.store.latest_stats(),
                 "channel_active": self.channel_active,
                 "channel_config": self.channel_config,
                 "channel_name": self.channel_name,
+                "channel_instrument": self.channel_instrument,
+                "channel_interval": self.channel_interval,
+                "channel_profile": {
+                    ch: str(profile) for ch, profile in self.channel_profile.items()
+                },
+                "instruments": dict(self.instrument_types),
                 "number_of_channels": self.number_of_channels,
                 "has_active": any(
                     self.channel_active.get(i)
@@ -234,79 +735,198 @@ class MeasurementController:
                 ),
             }
 
-    def build_chart_png(self) -> bytes:
-        fig, ax = plt.subplots(figsize=(8, 4))
+    def _range_reducer(
+        self,
+        start_ns: Optional[int],
+        end_ns: Optional[int],
+        span_s: Optional[float],
+        width: int,
+    ) -> Callable[[], tuple]:
+        """Capture a time range of the run for min/max decimation.
+
+        Must be called with the lock held; it only copies what is needed. The
+        returned function does the reduction without the lock and gives
+        (times, values, resolution) with at most 2 * width rows, whatever the
+        length of the run. The range defaults to the whole run, span_s selects
+        the last seconds up to end_ns. The coarsest rollup tier that still fills
+        every pixel column is used (resolution is its bucket size in seconds);
+        only short ranges fall back to the raw rows, read chunk by chunk.
+        """
+        n = self.number_of_channels
+        bounds = self.store.time_bounds()
+        if bounds is None:
+            return lambda: (np.zeros(0, dtype=np.int64), np.zeros((0, n)), None)
+        end_ns = bounds[1] if end_ns is None else end_ns
+        if start_ns is None:
+            start_ns = end_ns - int(span_s * 1e9) if span_s else bounds[0]
+        tier = self.store.rollup_tier(end_ns - start_ns, width, start_ns)
+        if tier is not None:
+            buckets = tier.range(start_ns, end_ns)
+        else:
+            snapshot = self.store.snapshot(start_ns, end_ns)
+
+        def reduce():
+            acc = MinMaxAccumulator(start_ns, end_ns, width, n)
+            if tier is None:
+                for times_ns, values in snapshot.iter_chunks():
+                    acc.add(times_ns, values)
+                return (*acc.result(), None)
+            acc.add_buckets(
+                buckets["t_first"], buckets["t_last"], buckets["min"], buckets["max"]
+            )
+            return (*acc.result(), tier.resolution_s)
+
+        return reduce
+
+    def build_chart_png(
+        self,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        span_s: Optional[float] = None,
+        width: int = 800,
+    ) -> bytes:
+        """PNG chart of the active channels, cached per data version and range.
+
+        Rendering happens in the chart renderer's worker; the lock is only held
+        to capture the data, never while rasterizing.
+        """
         with self._lock:
-            # convert times to timestamps
-            if self.times:
-                t0 = self.times[0]
-                xt = [(t - t0).total_seconds() for t in self.times]
-            else:
-                xt = []
-            for ch in range(1, self.number_of_channels + 1):
-                if self.channel_active.get(ch) and len(self.measurements.get(ch, [])):
-                    ys = self.measurements[ch]
-                    xplot = xt[: len(ys)]
-                    ax.plot(xplot, ys, label=f"CH{ch}")
-        ax.set_title("Measurements Over Time")
-        ax.set_xlabel("Time (s)")
-        ax.set_ylabel("Value")
-        ax.legend(loc="best")
-        buf = BytesIO()
-        fig.tight_layout()
-        fig.savefig(buf, format="png")
-        plt.close(fig)
-        buf.seek(0)
-        return buf.read()
-
-    def build_csv(self) -> bytes:
+            channels = tuple(
+                (ch, f"CH{ch}")
+                for ch in range(1, self.number_of_channels + 1)
+                if self.channel_active.get(ch)
+            )
+            version = (self.store.run_id, len(self.store))
+        key = (version, width, start_ns, end_ns, span_s, channels)
+
+        def capture():
+            with self._lock:
+                # at most two points per pixel column keep peaks and transients
+                reduce = self._range_reducer(start_ns, end_ns, span_s, width)
+            return lambda: reduce()[:2]
+
+        return self.chart_renderer.render(key, width, capture, channels)
+
+    def iter_csv(
+        self,
+        channels: Optional[List[int]] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        span_s: Optional[float] = None,
+        chunk_rows: int = 2000,
+    ) -> Iterator[bytes]:
+        """Stream the run as CSV in chunks of chunk_rows rows.
+
+        Only a snapshot is taken under the lock; formatting and reading spilled
+        segments happen while the generator is consumed, so the acquisition
+        thread never waits for an export. Channels averaged on the instrument
+        get their std, min and max as extra columns.
+        """
         with self._lock:
+            if span_s and start_ns is None:
+                bounds = self.store.time_bounds()
+                if bounds is not None:
+                    end = bounds[1] if end_ns is None else end_ns
+                    start_ns = end - int(span_s * 1e9)
+            snapshot = self.store.snapshot(start_ns, end_ns)
+        n = snapshot.number_of_channels
+        channels = [ch for ch in (channels or range(1, n + 1)) if 1 <= ch <= n]
+        columns = [ch - 1 for ch in channels]
+        stat_columns = [ch - 1 for ch in channels if ch in snapshot.stat_channels]
+        stat_names = [
+            f"CH{ch + 1} {name}" for ch in stat_columns for name in STAT_COLUMNS
+        ]
+
+        def generate():
             output = StringIO()
             writer = csv.writer(output)
-            header = ["Timestamp"] + [
-                f"CH{i}" for i in range(1, self.number_of_channels + 1)
-            ]
-            writer.writerow(header)
-            max_len = max(
-                [len(self.times)] + [len(v) for v in self.measurements.values()] or [0]
+            writer.writerow(["Timestamp"] + [f"CH{ch}" for ch in channels] + stat_names)
+            for times_ns, values, stats in snapshot.iter_chunks(with_stats=True):
+                values = values[:, columns]
+                if stat_columns:
+                    stats = stats[:, stat_columns].reshape(len(times_ns), -1)
+                    values = np.hstack([values, stats])
+                for i in range(0, len(times_ns), chunk_rows):
+                    rows = zip(
+                        times_ns[i : i + chunk_rows].tolist(),
+                        values[i : i + chunk_rows].tolist(),
+                    )
+                    for t, row in rows:
+                        ts = datetime.fromtimestamp(t / 1e9).strftime(
+                            "%Y-%m-%d %H:%M:%S"
+                        )
+                        # NaN marks a channel that was not measured in this scan
+                        writer.writerow([ts] + ["" if v != v else v for v in row])
+                    yield output.getvalue().encode("utf-8")
+                    output.seek(0)
+                    output.truncate()
+            if output.tell():
+                yield output.getvalue().encode("utf-8")
+
+        return generate()
+
+    def get_series(
+        self,
+        max_points: int = 500,
+        since: Optional[int] = None,
+        run: Optional[str] = None,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        span_s: Optional[float] = None,
+        width: Optional[int] = None,
+    ) -> dict:
+        """Series of the active channels for the live chart.
+
+        Without a cursor the last max_points rows are returned. With since (the
+        "seq" of a previous response) and run only the rows added in the meantime
+        are returned; "reset" tells the client whether to replace or append.
+        With a pixel width (and optionally a time range) the range is min/max
+        decimated to at most 2 * width rows instead; "resolution" is the rollup
+        bucket size in seconds used for it (None if raw rows were reduced).
+        """
+        with self._lock:
+            total = len(self.store)
+            decimated = width is not None
+            reset = (
+                decimated
+                or since is None
+                or run != self.store.run_id
+                or since > total
+                or since < total - max_points
             )
-            for i in range(max_len):
-                ts = (
-                    self.times[i].strftime("%Y-%m-%d %H:%M:%S")
-                    if i < len(self.times)
-                    else ""
+            resolution = None
+            if decimated:
+                reduce = self._range_reducer(
+                    start_ns, end_ns, span_s, max(1, min(width, 5000))
                 )
-                row = [ts]
-                for ch in range(1, self.number_of_channels + 1):
-                    vals = self.measurements.get(ch, [])
-                    row.append(vals[i] if i < len(vals) else "")
-                writer.writerow(row)
-            data = output.getvalue().encode("utf-8")
-        return data
-
-    def get_series(self, max_points: int = 500) -> dict:
-        with self._lock:
-            # Trim to last max_points for efficiency
-            if len(self.times) > max_points:
-                times = self.times[-max_points:]
+            elif reset:
+                # Only the last max_points rows are sliced out of the store
+                times_ns, values = self.store.tail(max_points)
             else:
-                times = list(self.times)
-            series = {}
-            for ch in range(1, self.number_of_channels + 1):
-                if self.channel_active.get(ch):
-                    vals = self.measurements.get(ch, [])
-                    if len(vals) > max_points:
-                        vals = vals[-max_points:]
-                    series[ch] = vals
-            return {
-                "times": [t.isoformat() for t in times],
-                "series": series,
-                "names": {
-                    ch: self.channel_name.get(ch, f"CH{ch}") for ch in series.keys()
-                },
-                "running": self.is_measuring,
-            }
-
-
-# Singleton controller for the app
-controller = MeasurementController()
+                times_ns, values = self.store.since(since)
+            active = [
+                ch
+                for ch in range(1, self.number_of_channels + 1)
+                if self.channel_active.get(ch)
+            ]
+            names = {ch: self.channel_name.get(ch, f"CH{ch}") for ch in active}
+            run_id = self.store.run_id
+        if decimated:
+            times_ns, values, resolution = reduce()
+        series = {
+            ch: [None if v != v else v for v in values[:, ch - 1].tolist()]
+            for ch in active
+        }
+        return {
+            "times": [
+                datetime.fromtimestamp(t / 1e9).isoformat() for t in times_ns.tolist()
+            ],
+            "series": series,
+            "names": names,
+            "running": self.is_measuring,
+            "seq": total,
+            "run": run_id,
+            "reset": reset,
+            "decimated": decimated,
+            "resolution": resolution,
+        }
@@ -0,0 +1,217 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class RollupTier:
+    """Per-channel min/max/sum/count of fixed time buckets of a run.
+
+    Buckets are updated incrementally as samples arrive; only the newest bucket
+    is ever modified, older buckets are final. The arrays grow by doubling, a
+    tier holds run length / resolution buckets. With max_buckets the tier only
+    keeps a sliding horizon of the newest max_buckets (up to twice as many
+    before the oldest ones are dropped), so its memory stays bounded.
+    """
+
+    def __init__(
+        self,
+        resolution_s: float,
+        number_of_channels: int,
+        capacity: int = 1024,
+        max_buckets: Optional[int] = None,
+    ):
+        self.resolution_s = resolution_s
+        self.resolution_ns = int(resolution_s * 1e9)
+        self.number_of_channels = number_of_channels
+        self.max_buckets = max_buckets
+        self._size = 0
+        self._dropped = False  # older buckets of the run were dropped
+        self._alloc(min(capacity, 2 * max_buckets) if max_buckets else capacity)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def covers(self, start_ns: Optional[int]) -> bool:
+        """Whether the tier still holds all buckets from start_ns on."""
+        if not self._dropped:
+            return True
+        return start_ns is not None and start_ns >= self._t_first[0]
+
+    def _alloc(self, capacity: int):
+        n = self.number_of_channels
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._t_first = np.zeros(capacity, dtype=np.int64)
+        self._t_last = np.zeros(capacity, dtype=np.int64)
+        self._min = np.full((capacity, n), np.nan)
+        self._max = np.full((capacity, n), np.nan)
+        self._sum = np.zeros((capacity, n))
+        self._count = np.zeros((capacity, n), dtype=np.int64)
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        old = (
+            self._ids,
+            self._t_first,
+            self._t_last,
+            self._min,
+            self._max,
+            self._sum,
+            self._count,
+        )
+        capacity = max(needed, 2 * capacity)
+        if self.max_buckets:
+            capacity = min(capacity, 2 * self.max_buckets)
+        self._alloc(capacity)
+        new = (
+            self._ids,
+            self._t_first,
+            self._t_last,
+            self._min,
+            self._max,
+            self._sum,
+            self._count,
+        )
+        for src, dst in zip(old, new):
+            dst[: self._size] = src[: self._size]
+
+    def _drop_oldest(self, drop: int):
+        """Remove the oldest drop buckets."""
+        drop = min(drop, self._size)
+        if drop <= 0:
+            return
+        for a in (
+            self._ids,
+            self._t_first,
+            self._t_last,
+            self._min,
+            self._max,
+            self._sum,
+            self._count,
+        ):
+            a[: self._size - drop] = a[drop : self._size]
+        self._size -= drop
+        self._dropped = True
+
+    def clear(self):
+        self._size = 0
+        self._dropped = False
+        self._alloc(min(1024, 2 * self.max_buckets) if self.max_buckets else 1024)
+
+    def resize(self, number_of_channels: int):
+        keep = min(number_of_channels, self.number_of_channels)
+        old = (self._min, self._max, self._sum, self._count)
+        ids, t_first, t_last = self._ids, self._t_first, self._t_last
+        self.number_of_channels = number_of_channels
+        self._alloc(len(ids))
+        self._ids, self._t_first, self._t_last = ids, t_first, t_last
+        for src, dst in zip(old, (self._min, self._max, self._sum, self._count)):
+            dst[:, :keep] = src[:, :keep]
+
+    def add(self, times: np.ndarray, values: np.ndarray):
+        """Fold time ordered rows (values[n, channels]) into the buckets."""
+        if len(times) == 0:
+            return
+        ids = times // self.resolution_ns
+        starts = np.flatnonzero(np.diff(ids, prepend=ids[0] - 1))
+        ends = np.append(starts[1:], len(times)) - 1
+        valid = ~np.isnan(values)
+        vmin = np.fmin.reduceat(values, starts)
+        vmax = np.fmax.reduceat(values, starts)
+        vsum = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        count = np.add.reduceat(valid.astype(np.int64), starts)
+        bucket_ids = ids[starts]
+        t_first, t_last = times[starts], times[ends]
+        first = 0
+        # the first group may continue the still open newest bucket
+        if self._size and bucket_ids[0] == self._ids[self._size - 1]:
+            j = self._size - 1
+            self._min[j] = np.fmin(self._min[j], vmin[0])
+            self._max[j] = np.fmax(self._max[j], vmax[0])
+            self._sum[j] += vsum[0]
+            self._count[j] += count[0]
+            self._t_last[j] = t_last[0]
+            first = 1
+        k = len(bucket_ids) - first
+        if k == 0:
+            return
+        if self.max_buckets:
+            # only the newest buckets are kept, at most twice max_buckets
+            if k > self.max_buckets:
+                first += k - self.max_buckets
+                k = self.max_buckets
+                self._dropped = True
+            self._drop_oldest(self._size + k - 2 * self.max_buckets)
+        self._grow(self._size + k)
+        sl = slice(self._size, self._size + k)
+        self._ids[sl] = bucket_ids[first:]
+        self._t_first[sl] = t_first[first:]
+        self._t_last[sl] = t_last[first:]
+        self._min[sl] = vmin[first:]
+        self._max[sl] = vmax[first:]
+        self._sum[sl] = vsum[first:]
+        self._count[sl] = count[first:]
+        self._size += k
+        if self.max_buckets and self._size >= 2 * self.max_buckets:
+            # amortized: one shift per max_buckets new buckets
+            self._drop_oldest(self._size - self.max_buckets)
+
+    def range(
+        self, start_ns: Optional[int] = None, end_ns: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """Copy of the buckets starting within [start_ns, end_ns]."""
+        t_first = self._t_first[: self._size]
+        lo = 0 if start_ns is None else int(np.searchsorted(t_first, start_ns))
+        hi = (
+            self._size
+            if end_ns is None
+            else int(np.searchsorted(t_first, end_ns, side="right"))
+        )
+        count = self._count[lo:hi]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._sum[lo:hi] / count
+        return {
+            "t_first": t_first[lo:hi].copy(),
+            "t_last": self._t_last[lo:hi].copy(),
+            "min": self._min[lo:hi].copy(),
+            "max": self._max[lo:hi].copy(),
+            "mean": mean,
+            "count": count.copy(),
+        }
+
+    def memory_bytes(self) -> int:
+        return sum(
+            a.nbytes
+            for a in (
+                self._ids,
+                self._t_first,
+                self._t_last,
+                self._min,
+                self._max,
+                self._sum,
+                self._count,
+            )
+        )
+
+
+def select_tier(
+    tiers, span_ns: int, width: int, start_ns: Optional[int] = None
+) -> Optional[RollupTier]:
+    """Coarsest tier that still has at least one bucket per pixel column and
+    still holds the buckets from start_ns on (None: the whole run).
+
+    Spans older than the horizon of the fine enough tiers are answered by the
+    finest tier that still holds them, even with fewer buckets than columns.
+    None if even the finest tier is too coarse for the span.
+    """
+    best = None
+    fine = [tier for tier in tiers if tier.resolution_ns * width <= span_ns]
+    for tier in fine:
+        if tier.covers(start_ns):
+            if best is None or tier.resolution_ns > best.resolution_ns:
+                best = tier
+    if best is None and fine:
+        older = [tier for tier in tiers if tier.covers(start_ns)]
+        best = min(older, key=lambda tier: tier.resolution_ns, default=None)
+    return best
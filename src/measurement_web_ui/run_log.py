@@ -0,0 +1,372 @@
+import atexit
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from sensor_conversions import SENSORS, convert
+
+
+class RunLog:
+    """Durable, append-only log of all measured scans in SQLite (WAL mode).
+
+    append() only queues the scan, so it never blocks the acquisition thread.
+    A writer thread inserts the queued scans in batches and commits at least
+    every flush_interval seconds; with synchronous=FULL every commit is
+    fsynced, so a crash or power cut loses at most the last interval.
+    Each scan is stored as one row holding the float64 values of all channels
+    as a blob (NaN for channels that were not measured), together with the raw
+    readings (resistance, voltage) they were converted from. The sensor
+    configuration of every channel is recorded from the sequence number it was
+    first used at, so the values of a run can be recomputed with reprocess()
+    after a sensor's coefficients were corrected. Channels averaged on the
+    instrument also store the (std, min, max) of their readings, converted and
+    raw.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._known_runs = set()
+        # last recorded sensor configuration per run and channel (writer thread)
+        self._sensors: Dict[str, Dict[int, str]] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id TEXT PRIMARY KEY, started_ns INTEGER, ended_ns INTEGER)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS samples ("
+                "run_id TEXT, seq INTEGER, t_ns INTEGER, vals BLOB, raw BLOB, "
+                "PRIMARY KEY (run_id, seq)) WITHOUT ROWID"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(samples)")]
+            if "raw" not in columns:
+                # run logs written before the raw readings were kept
+                conn.execute("ALTER TABLE samples ADD COLUMN raw BLOB")
+            if "stats" not in columns:
+                conn.execute("ALTER TABLE samples ADD COLUMN stats BLOB")
+            if "raw_stats" not in columns:
+                conn.execute("ALTER TABLE samples ADD COLUMN raw_stats BLOB")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sensors ("
+                "run_id TEXT, channel INTEGER, from_seq INTEGER, sensor TEXT, "
+                "PRIMARY KEY (run_id, channel, from_seq)) WITHOUT ROWID"
+            )
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    # ---- acquisition side (non blocking) -----
+    def append(
+        self,
+        run_id: str,
+        seq: int,
+        ts_ns: int,
+        values: Dict[int, Optional[float]],
+        number_of_channels: int,
+        raw: Optional[Dict[int, Optional[float]]] = None,
+        sensors: Optional[Dict[int, str]] = None,
+        stats: Optional[Dict[int, tuple]] = None,
+        raw_stats: Optional[Dict[int, tuple]] = None,
+    ):
+        """Queue one scan; raw holds the unconverted readings, sensors the
+        configuration of every measured channel, stats the (std, min, max) of
+        the averaged ones and raw_stats the unconverted (std, min, max)."""
+        self._queue.put(
+            (
+                "sample",
+                run_id,
+                seq,
+                ts_ns,
+                values,
+                number_of_channels,
+                raw,
+                sensors,
+                stats,
+                raw_stats,
+            )
+        )
+
+    def close_run(self, run_id: str):
+        """Mark the run as finished, it will not be reopened on restart."""
+        self._queue.put(("close", run_id, time.time_ns()))
+
+    def flush(self, timeout: float = 10.0):
+        """Block until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self.flush()
+
+    # ---- recovery -----
+    def last_open_run(self) -> Optional[str]:
+        """Id of the most recent run that was never closed."""
+        with contextlib.closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id FROM runs WHERE ended_ns IS NULL "
+                "ORDER BY started_ns DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def iter_samples(
+        self, run_id: str, chunk_rows: int = 50_000
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]:
+        """Yield (times, values, stats) chunks of a run in sequence order; stats
+        are (rows, channels, 3) or None if no row of the chunk has statistics."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "SELECT t_ns, vals, stats FROM samples WHERE run_id = ? ORDER BY seq",
+                (run_id,),
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                times = np.array([t for t, _, _ in rows], dtype=np.int64)
+                stats = None
+                if any(blob is not None for _, _, blob in rows):
+                    stats = _unpack([blob or b"" for _, _, blob in rows])
+                    stats = stats.reshape(len(rows), -1, 3)
+                yield times, _unpack([vals for _, vals, _ in rows]), stats
+        finally:
+            conn.close()
+
+    # ---- reprocessing -----
+    def sensors(self, run_id: str) -> List[Tuple[int, int, str]]:
+        """(channel, from_seq, sensor) of every configuration change of a run."""
+        with contextlib.closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT channel, from_seq, sensor FROM sensors WHERE run_id = ? "
+                "ORDER BY channel, from_seq",
+                (run_id,),
+            ).fetchall()
+
+    def reprocess(self, run_id: str, chunk_rows: int = 100_000) -> int:
+        """Recompute the values of a run from its raw readings.
+
+        The raw readings are converted with the current sensor registry, a
+        chunk of rows at a time with one vectorized conversion per channel and
+        sensor. Rows logged without raw readings are kept. The min and max of
+        averaged channels are recomputed from their raw min and max; the std of
+        a sensor cannot be recomputed through its nonlinear conversion and is
+        dropped (NaN), the std of raw configurations is kept. Statistics logged
+        without raw statistics are kept as they are. Returns the number of rows
+        that were recomputed.
+        """
+        self.flush()
+        # sequence ranges [from_seq, to_seq) of every channel's configurations
+        spans: Dict[int, List[Tuple[int, float, str]]] = {}
+        changes = self.sensors(run_id)
+        for i, (channel, from_seq, sensor) in enumerate(changes):
+            following = changes[i + 1] if i + 1 < len(changes) else None
+            to_seq = (
+                following[1]
+                if following is not None and following[0] == channel
+                else float("inf")
+            )
+            spans.setdefault(channel, []).append((from_seq, to_seq, sensor))
+        update = "UPDATE samples SET vals = ?, stats = ? WHERE run_id = ? AND seq = ?"
+        done = 0
+        last_seq = -1
+        conn = self._connect()
+        try:
+            while True:
+                rows = conn.execute(
+                    "SELECT seq, raw, stats, raw_stats FROM samples "
+                    "WHERE run_id = ? AND seq > ? AND raw IS NOT NULL "
+                    "ORDER BY seq LIMIT ?",
+                    (run_id, last_seq, chunk_rows),
+                ).fetchall()
+                if not rows:
+                    break
+                seqs = np.array([row[0] for row in rows], dtype=np.int64)
+                raw = _unpack([row[1] for row in rows])
+                values = raw.copy()
+                stats = _unpack_stats([row[2] for row in rows], raw.shape[1])
+                raw_stats = _unpack_stats([row[3] for row in rows], raw.shape[1])
+                for channel, channel_spans in spans.items():
+                    if not 1 <= channel <= raw.shape[1]:
+                        continue
+                    for from_seq, to_seq, sensor in channel_spans:
+                        mask = (seqs >= from_seq) & (seqs < to_seq)
+                        if not mask.any():
+                            continue
+                        col = channel - 1
+                        values[mask, col] = convert(sensor, raw[mask, col])
+                        averaged = mask & ~np.isnan(raw_stats[:, col]).all(axis=1)
+                        if averaged.any():
+                            stats[averaged, col] = _convert_stats(
+                                sensor, raw_stats[averaged, col]
+                            )
+                # rows without raw statistics keep their statistics blob
+                stats_blobs = [
+                    row[2] if row[3] is None else row_stats.tobytes()
+                    for row, row_stats in zip(rows, stats)
+                ]
+                # one transaction per chunk keeps the writer thread unblocked
+                with conn:
+                    conn.executemany(
+                        update,
+                        zip(
+                            [row.tobytes() for row in values],
+                            stats_blobs,
+                            [run_id] * len(rows),
+                            seqs.tolist(),
+                        ),
+                    )
+                done += len(rows)
+                last_seq = int(seqs[-1])
+        finally:
+            conn.close()
+        return done
+
+    # ---- writer thread -----
+    def _write_loop(self):
+        conn = self._connect()
+        pending = []
+        last_commit = time.monotonic()
+        while True:
+            timeout = max(0.0, last_commit + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            flush_event = None
+            if item is not None:
+                if item[0] == "flush":
+                    flush_event = item[1]
+                else:
+                    pending.append(item)
+            due = time.monotonic() - last_commit >= self.flush_interval
+            if pending and (flush_event or due or len(pending) >= self.batch_size):
+                try:
+                    self._write(conn, pending)
+                except sqlite3.Error as e:
+                    print(f"Run log write error: {e}")
+                pending = []
+            if flush_event or due:
+                last_commit = time.monotonic()
+            if flush_event:
+                flush_event.set()
+
+    def _write(self, conn: sqlite3.Connection, items):
+        insert = (
+            "INSERT OR REPLACE INTO samples "
+            "(run_id, seq, t_ns, vals, raw, stats, raw_stats) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)"
+        )
+        samples = []
+        sensor_changes = []
+        new_runs = set()
+        with conn:
+            for item in items:
+                if item[0] == "sample":
+                    _, run_id, seq, ts_ns, values, n = item[:6]
+                    raw, sensors, stats, raw_stats = item[6:]
+                    if run_id not in self._known_runs | new_runs:
+                        conn.execute(
+                            "INSERT OR IGNORE INTO runs (id, started_ns) VALUES (?, ?)",
+                            (run_id, ts_ns),
+                        )
+                        new_runs.add(run_id)
+                    raw_blob = None if raw is None else _pack(raw, n)
+                    stats_blob = _pack_stats(stats, n) if stats else None
+                    raw_stats_blob = _pack_stats(raw_stats, n) if raw_stats else None
+                    samples.append(
+                        (
+                            run_id,
+                            seq,
+                            ts_ns,
+                            _pack(values, n),
+                            raw_blob,
+                            stats_blob,
+                            raw_stats_blob,
+                        )
+                    )
+                    known = self._sensors.setdefault(run_id, {})
+                    for ch, sensor in (sensors or {}).items():
+                        if known.get(ch) != sensor:
+                            known[ch] = sensor
+                            sensor_changes.append((run_id, ch, seq, sensor))
+                elif item[0] == "close":
+                    conn.executemany(insert, samples)
+                    samples = []
+                    conn.execute(
+                        "UPDATE runs SET ended_ns = ? WHERE id = ?", (item[2], item[1])
+                    )
+                    self._sensors.pop(item[1], None)
+            conn.executemany(insert, samples)
+            conn.executemany(
+                "INSERT OR REPLACE INTO sensors VALUES (?, ?, ?, ?)", sensor_changes
+            )
+        self._known_runs |= new_runs
+
+
+def _pack(values: Dict[int, Optional[float]], n: int) -> bytes:
+    """Blob of the float64 values of channels 1..n, NaN where missing."""
+    row = np.full(n, np.nan)
+    for ch, val in values.items():
+        if val is not None and 1 <= ch <= n:
+            row[ch - 1] = val
+    return row.tobytes()
+
+
+def _pack_stats(stats: Dict[int, tuple], n: int) -> bytes:
+    """Blob of the (std, min, max) of channels 1..n, NaN where missing."""
+    rows = np.full((n, 3), np.nan)
+    for ch, stat in stats.items():
+        if 1 <= ch <= n:
+            rows[ch - 1] = np.array(stat, dtype=float)
+    return rows.tobytes()
+
+
+def _unpack_stats(blobs: List[Optional[bytes]], n: int) -> np.ndarray:
+    """(rows, n, 3) statistics of blobs, NaN for missing blobs and channels."""
+    stats = np.full((len(blobs), n, 3), np.nan)
+    for i, blob in enumerate(blobs):
+        if blob:
+            row = np.frombuffer(blob, dtype=np.float64).reshape(-1, 3)[:n]
+            stats[i, : len(row)] = row
+    return stats
+
+
+def _convert_stats(sensor: str, raw_stats: np.ndarray) -> np.ndarray:
+    """(std, min, max) rows of raw statistics converted with a sensor; min and
+    max are swapped for falling conversions, the std of sensors is NaN."""
+    low, high = convert(sensor, raw_stats[:, 1]), convert(sensor, raw_stats[:, 2])
+    std = np.full(len(raw_stats), np.nan) if sensor in SENSORS else raw_stats[:, 0]
+    return np.column_stack((std, np.minimum(low, high), np.maximum(low, high)))
+
+
+def _unpack(blobs: List[bytes]) -> np.ndarray:
+    """Rows of float64 values from blobs, padded with NaN to the widest one."""
+    widths = {len(blob) for blob in blobs}
+    if len(widths) == 1:
+        # all rows have the same number of channels, decode them at once
+        width = widths.pop() // 8
+        return np.frombuffer(b"".join(blobs), dtype=np.float64).reshape(-1, width)
+    width = max(widths) // 8
+    values = np.full((len(blobs), width), np.nan)
+    for i, blob in enumerate(blobs):
+        row = np.frombuffer(blob, dtype=np.float64)
+        values[i, : len(row)] = row
+    return values
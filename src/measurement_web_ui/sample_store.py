@@ -0,0 +1,459 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .rollups import RollupTier, select_tier
+
+# Bucket sizes in seconds of the rollup tiers, only the coarsest one is kept for
+# the whole run
+ROLLUP_RESOLUTIONS = (10, 60, 600, 3600)
+# Buckets the finer tiers keep (about 5.7 h of 10 s, 34 h of 1 min and 14 days
+# of 10 min buckets), older spans are answered by the coarser tiers
+ROLLUP_BUCKETS = 2048
+# Statistics columns of the channels averaged on the instrument, besides the mean
+STAT_COLUMNS = ("std", "min", "max")
+
+class SampleStore:
+    """Columnar ring buffer of measured scan rows.
+
+    Every row holds an int64 epoch-ns timestamp and one float64 value per
+    channel (NaN where the channel was not measured). Only the newest
+    ``window`` rows are kept in memory; older rows are spilled in chunks of
+    ``spill_chunk`` rows to ``.npz`` segments on disk, so memory stays flat for
+    runs of any length. Segments are written by a writer thread, so a slow disk
+    does not stall the caller; until then they are read from their copy.
+
+    In addition per-channel min/max/mean/count rollups are kept in memory for
+    every resolution in ``rollup_resolutions`` (seconds); they are updated as
+    rows arrive and let long ranges be plotted without reading the spilled
+    segments. The finer tiers only keep the newest ``rollup_buckets`` buckets,
+    the coarsest one covers the whole run.
+
+    Channels averaged on the instrument store their mean as value and the
+    ``STAT_COLUMNS`` (std, min, max) of the readings as extra columns. The
+    statistics buffer is only allocated once the first statistics arrive.
+    """
+
+    def __init__(
+        self,
+        number_of_channels: int,
+        window: int = 100_000,
+        spill_chunk: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        rollup_resolutions: Tuple[float, ...] = ROLLUP_RESOLUTIONS,
+        rollup_buckets: Optional[int] = ROLLUP_BUCKETS,
+    ):
+        self.number_of_channels = number_of_channels
+        self.window = window
+        self.spill_chunk = min(spill_chunk or max(1, window // 4), window)
+        self.spill_dir = spill_dir
+        self._own_spill_dir = spill_dir is None
+        self._segments: List[dict] = []
+        self._spill_queue: queue.Queue = queue.Queue()
+        self._spill_thread: Optional[threading.Thread] = None
+        self._times = np.zeros(window, dtype=np.int64)
+        self._values = np.full((window, number_of_channels), np.nan)
+        self._latest = np.full(number_of_channels, np.nan)
+        # (window, channels, STAT_COLUMNS), None until a row has statistics
+        self._stats: Optional[np.ndarray] = None
+        self._latest_stats = np.full((number_of_channels, len(STAT_COLUMNS)), np.nan)
+        self._start = 0  # ring index of the oldest row in memory
+        self._count = 0  # rows in memory
+        self._total = 0  # rows appended since the last clear
+        coarsest = max(rollup_resolutions, default=None)
+        self.rollups = [
+            RollupTier(
+                r,
+                number_of_channels,
+                max_buckets=None if r == coarsest else rollup_buckets,
+            )
+            for r in rollup_resolutions
+        ]
+        # changes on every clear, so clients can tell their sequence numbers apart
+        self.run_id = uuid.uuid4().hex
+
+    def __len__(self) -> int:
+        return self._total
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest row still held in memory."""
+        return self._total - self._count
+
+    def append(
+        self,
+        ts_ns: int,
+        values: Dict[int, Optional[float]],
+        stats: Optional[Dict[int, tuple]] = None,
+    ) -> int:
+        """Append one scan row and return its sequence number.
+
+        values maps channel numbers (1-based) to their reading; channels that are
+        missing or None are stored as NaN. stats maps averaged channels to their
+        (std, min, max).
+        """
+        if self._count == self.window:
+            self._spill()
+        idx = (self._start + self._count) % self.window
+        row = self._values[idx]
+        row.fill(np.nan)
+        for ch, val in values.items():
+            if val is not None and 1 <= ch <= self.number_of_channels:
+                row[ch - 1] = val
+        self._times[idx] = ts_ns
+        np.copyto(self._latest, row, where=~np.isnan(row))
+        for tier in self.rollups:
+            tier.add(self._times[idx : idx + 1], row[np.newaxis])
+        if stats or self._stats is not None:
+            stats_row = self._stats_buffer()[idx]
+            stats_row.fill(np.nan)
+            for ch, stat in (stats or {}).items():
+                if 1 <= ch <= self.number_of_channels:
+                    stats_row[ch - 1] = np.array(stat, dtype=float)
+            self._update_latest_stats(stats_row[np.newaxis])
+        self._count += 1
+        self._total += 1
+        return self._total - 1
+
+    def extend(
+        self,
+        times: np.ndarray,
+        values: np.ndarray,
+        stats: Optional[np.ndarray] = None,
+    ):
+        """Append many rows at once, e.g. when a run is reloaded from disk.
+
+        values has one column per channel; extra columns are dropped and missing
+        ones are filled with NaN. stats are the (rows, channels, STAT_COLUMNS)
+        statistics of the rows, if any.
+        """
+        n = self.number_of_channels
+        done = 0
+        while done < len(times):
+            if self._count == self.window:
+                self._spill()
+            k = min(self.window - self._count, len(times) - done)
+            idx = (self._start + self._count + np.arange(k)) % self.window
+            block = np.full((k, n), np.nan)
+            keep = min(n, values.shape[1])
+            block[:, :keep] = values[done : done + k, :keep]
+            self._times[idx] = times[done : done + k]
+            self._values[idx] = block
+            # latest valid value of every column in this block
+            valid = ~np.isnan(block)
+            last = k - 1 - np.argmax(valid[::-1], axis=0)
+            has = valid.any(axis=0)
+            self._latest[has] = block[last[has], np.flatnonzero(has)]
+            for tier in self.rollups:
+                tier.add(times[done : done + k], block)
+            if stats is not None or self._stats is not None:
+                stats_block = np.full((k, n, len(STAT_COLUMNS)), np.nan)
+                if stats is not None:
+                    keep = min(n, stats.shape[1])
+                    stats_block[:, :keep] = stats[done : done + k, :keep]
+                self._stats_buffer()[idx] = stats_block
+                self._update_latest_stats(stats_block)
+            self._count += k
+            self._total += k
+            done += k
+
+    def resize(self, number_of_channels: int):
+        """Change the number of channel columns, keeping the collected data."""
+        if number_of_channels == self.number_of_channels:
+            return
+        keep = min(number_of_channels, self.number_of_channels)
+        values = np.full((self.window, number_of_channels), np.nan)
+        values[:, :keep] = self._values[:, :keep]
+        latest = np.full(number_of_channels, np.nan)
+        latest[:keep] = self._latest[:keep]
+        self._values = values
+        self._latest = latest
+        latest_stats = np.full((number_of_channels, len(STAT_COLUMNS)), np.nan)
+        latest_stats[:keep] = self._latest_stats[:keep]
+        self._latest_stats = latest_stats
+        if self._stats is not None:
+            stats = np.full((self.window,) + latest_stats.shape, np.nan)
+            stats[:, :keep] = self._stats[:, :keep]
+            self._stats = stats
+        self.number_of_channels = number_of_channels
+        for tier in self.rollups:
+            tier.resize(number_of_channels)
+
+    def clear(self):
+        """Drop all rows in memory and on disk."""
+        self._start = 0
+        self._count = 0
+        self._total = 0
+        self.run_id = uuid.uuid4().hex
+        self._latest.fill(np.nan)
+        self._stats = None
+        self._latest_stats.fill(np.nan)
+        for seg in self._segments:
+            # segments still queued are not written any more
+            seg["dropped"] = True
+        self._segments = []
+        for tier in self.rollups:
+            tier.clear()
+        if self._own_spill_dir and self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+        elif self.spill_dir:
+            for name in os.listdir(self.spill_dir):
+                if name.startswith("segment_") and name.endswith(".npz"):
+                    os.remove(os.path.join(self.spill_dir, name))
+
+    def latest(self) -> Dict[int, Optional[float]]:
+        """Latest valid value of every channel (None if never measured)."""
+        return {
+            ch: (None if np.isnan(val) else float(val))
+            for ch, val in enumerate(self._latest, start=1)
+        }
+
+    def latest_stats(self) -> Dict[int, dict]:
+        """Latest statistics of every averaged channel as {"std", "min", "max"}."""
+        return {
+            ch: {
+                name: (None if np.isnan(val) else float(val))
+                for name, val in zip(STAT_COLUMNS, row)
+            }
+            for ch, row in enumerate(self._latest_stats, start=1)
+            if not np.isnan(row).all()
+        }
+
+    def tail(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy of the newest n rows in memory (all of them if n is None)."""
+        idx = self._tail_index(n)
+        return self._times[idx], self._values[idx]
+
+    def time_bounds(self) -> Optional[Tuple[int, int]]:
+        """(first, last) timestamp in ns of the whole run, None if empty."""
+        if self._total == 0:
+            return None
+        first = self._segments[0]["t_first"] if self._segments else None
+        if self._count:
+            last_idx = (self._start + self._count - 1) % self.window
+            if first is None:
+                first = int(self._times[self._start])
+            return first, int(self._times[last_idx])
+        return first, self._segments[-1]["t_last"]
+
+    def since(self, seq: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy of the rows in memory with a sequence number >= seq."""
+        return self.tail(self._total - max(seq, self.first_seq))
+
+    def iter_chunks(
+        self, start_ns: Optional[int] = None, end_ns: Optional[int] = None
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Yield (times, values) chunks of the whole run in time order."""
+        return self.snapshot(start_ns, end_ns).iter_chunks()
+
+    def snapshot(
+        self, start_ns: Optional[int] = None, end_ns: Optional[int] = None
+    ) -> "SampleSnapshot":
+        """Point-in-time copy of the run (or a time range of it).
+
+        Only the rows in memory are copied; spilled segments are immutable and
+        are read from disk when the snapshot is iterated, so the snapshot can be
+        read without holding the lock that guards the store.
+        """
+        idx = self._tail_index()
+        stats = None if self._stats is None else self._stats[idx]
+        times, values, stats = _select(
+            self._times[idx], self._values[idx], start_ns, end_ns, stats
+        )
+        return SampleSnapshot(
+            self.number_of_channels,
+            list(self._segments),
+            times,
+            values,
+            start_ns,
+            end_ns,
+            stats,
+            tuple(self.latest_stats()),
+        )
+
+    def rollup_tier(
+        self, span_ns: int, width: int, start_ns: Optional[int] = None
+    ) -> Optional[RollupTier]:
+        """Coarsest rollup tier with at least one bucket per pixel column that
+        still holds the buckets from start_ns on, older spans get the finest
+        tier still holding them.
+
+        Returns None if even the finest tier is too coarse for the span, the raw
+        rows have to be used then.
+        """
+        return select_tier(self.rollups, span_ns, width, start_ns)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the in-memory buffers."""
+        return (
+            self._times.nbytes
+            + self._values.nbytes
+            + self._latest.nbytes
+            + (0 if self._stats is None else self._stats.nbytes)
+            + sum(tier.memory_bytes() for tier in self.rollups)
+        )
+
+    # ---- internal helpers -----
+    def _tail_index(self, n: Optional[int] = None) -> np.ndarray:
+        """Ring indices of the newest n rows in memory (all of them if None)."""
+        n = self._count if n is None else max(0, min(n, self._count))
+        return (self._start + self._count - n + np.arange(n)) % self.window
+
+    def _stats_buffer(self) -> np.ndarray:
+        if self._stats is None:
+            shape = (self.window, self.number_of_channels, len(STAT_COLUMNS))
+            self._stats = np.full(shape, np.nan)
+        return self._stats
+
+    def _update_latest_stats(self, block: np.ndarray):
+        """Keep the statistics of the newest rows averaging a channel."""
+        valid = ~np.isnan(block).all(axis=2)
+        has = valid.any(axis=0)
+        last = len(block) - 1 - np.argmax(valid[::-1], axis=0)
+        self._latest_stats[has] = block[last[has], np.flatnonzero(has)]
+
+    def flush(self):
+        """Block until all spilled segments are written to disk."""
+        self._spill_queue.join()
+
+    def _spill(self):
+        """Move the oldest spill_chunk rows from memory into a segment on disk.
+
+        The rows are copied and handed to the writer thread; the segment holds
+        the copy ("arrays") until its file is written.
+        """
+        k = self.spill_chunk
+        idx = (self._start + np.arange(k)) % self.window
+        times, values = self._times[idx], self._values[idx]
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="outgassing_samples_")
+        path = os.path.join(self.spill_dir, f"segment_{len(self._segments):06d}.npz")
+        arrays = {"times": times, "values": values}
+        if self._stats is not None:
+            arrays["stats"] = self._stats[idx]
+        segment = {
+            "path": path,
+            "first_seq": self.first_seq,
+            "rows": k,
+            "t_first": int(times[0]),
+            "t_last": int(times[-1]),
+            "arrays": arrays,
+        }
+        self._segments.append(segment)
+        if self._spill_thread is None:
+            self._spill_thread = threading.Thread(
+                target=self._spill_loop, name="sample-spill", daemon=True
+            )
+            self._spill_thread.start()
+        self._spill_queue.put(segment)
+        self._start = (self._start + k) % self.window
+        self._count -= k
+
+    def _spill_loop(self):
+        """Writer thread: saves the queued segments and drops their copies."""
+        while True:
+            segment = self._spill_queue.get()
+            try:
+                if not segment.get("dropped"):
+                    # written under a temporary name, readers never see half a file
+                    partial = segment["path"] + ".partial.npz"
+                    np.savez(partial, **segment["arrays"])
+                    os.replace(partial, segment["path"])
+                    if segment.get("dropped"):
+                        os.remove(segment["path"])
+                    segment.pop("arrays", None)
+            except OSError as e:
+                if not segment.get("dropped"):
+                    print(f"Sample spill error: {e}")
+            finally:
+                self._spill_queue.task_done()
+
+
+class SampleSnapshot:
+    """Rows of a SampleStore captured by SampleStore.snapshot()."""
+
+    def __init__(
+        self,
+        number_of_channels: int,
+        segments: List[dict],
+        times: np.ndarray,
+        values: np.ndarray,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        stats: Optional[np.ndarray] = None,
+        stat_channels: Tuple[int, ...] = (),
+    ):
+        self.number_of_channels = number_of_channels
+        self.segments = segments
+        self.times = times
+        self.values = values
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.stats = stats
+        # channels with statistics in the run, i.e. averaged on the instrument
+        self.stat_channels = stat_channels
+
+    def iter_chunks(self, with_stats: bool = False) -> Iterator[tuple]:
+        """Yield (times, values) chunks in time order, (times, values, stats)
+        with_stats (NaN for rows without statistics).
+
+        Spilled segments are read back from disk one at a time (or from their
+        copy while still queued for writing), followed by the copied rows from
+        memory. Segments recorded with fewer channels are padded
+        with NaN; segments removed by a clear in the meantime are skipped.
+        """
+        start_ns, end_ns = self.start_ns, self.end_ns
+        for seg in self.segments:
+            if start_ns is not None and seg["t_last"] < start_ns:
+                continue
+            if end_ns is not None and seg["t_first"] > end_ns:
+                continue
+            arrays = seg.get("arrays")
+            try:
+                if arrays is None:
+                    with np.load(seg["path"]) as data:
+                        arrays = {name: data[name] for name in data.files}
+            except OSError:
+                continue
+            times, values = arrays["times"], arrays["values"]
+            stats = arrays.get("stats")
+            chunk = _select(times, self._pad(values), start_ns, end_ns, stats)
+            yield self._chunk(*chunk, with_stats)
+        yield self._chunk(self.times, self.values, self.stats, with_stats)
+
+    def _chunk(self, times, values, stats, with_stats):
+        if not with_stats:
+            return times, values
+        if stats is None:
+            shape = (len(times), self.number_of_channels, len(STAT_COLUMNS))
+            return times, values, np.full(shape, np.nan)
+        return times, values, self._pad(stats)
+
+    def _pad(self, values: np.ndarray) -> np.ndarray:
+        n = self.number_of_channels
+        if values.shape[1] == n:
+            return values
+        padded = np.full((values.shape[0], n) + values.shape[2:], np.nan)
+        keep = min(n, values.shape[1])
+        padded[:, :keep] = values[:, :keep]
+        return padded
+
+
+def _select(times, values, start_ns, end_ns, stats=None):
+    """Rows with start_ns <= time <= end_ns (open ends if None), as (times,
+    values, stats)."""
+    if start_ns is None and end_ns is None:
+        return times, values, stats
+    mask = np.ones(len(times), dtype=bool)
+    if start_ns is not None:
+        mask &= times >= start_ns
+    if end_ns is not None:
+        mask &= times <= end_ns
+    return times[mask], values[mask], None if stats is None else stats[mask]
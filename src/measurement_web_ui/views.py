@@ -1,16 +1,47 @@
 from flask import (
     Blueprint,
+    Response,
     render_template,
     request,
     redirect,
     url_for,
-    send_file,
     flash,
+    g,
+    json,
 )
-from .controller import controller, CHANNEL_OPTIONS
-from io import BytesIO
+from .controller import CHANNEL_OPTIONS, MeasurementController
+from metrics import REGISTRY, Histogram
+from datetime import datetime
+import queue
+import time
 
 views = Blueprint("views", __name__)
+# Singleton controller for the app, created with the views so that importing
+# the controller module (e.g. by the benchmarks) does not open the run log
+controller = MeasurementController()
+
+REQUEST_SECONDS = Histogram(
+    "outgassing_http_request_seconds",
+    "Latency of the data endpoints until the response is sent completely.",
+    ["endpoint"],
+)
+METERED_ENDPOINTS = ("views.api_state", "views.chart_png", "views.export_csv")
+
+
+@views.before_request
+def _start_request_timer():
+    if request.endpoint in METERED_ENDPOINTS:
+        g.request_started = time.perf_counter()
+
+
+@views.after_request
+def _observe_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        histogram = REQUEST_SECONDS.labels(request.endpoint.split(".")[-1])
+        # streamed responses (export.csv) are only complete when closed
+        response.call_on_close(lambda: histogram.observe(time.perf_counter() - started))
+    return response
 
 
 @views.route("/", methods=["GET", "POST"])
@@ -37,6 +68,9 @@ def dashboard():
                     flash("Measurement started", "success")
                 except RuntimeError as re:
                     flash(str(re), "error")
+            elif action == "disconnect":
+                controller.disconnect(request.form.get("address", ""))
+                flash("Disconnected", "success")
             elif action == "stop":
                 controller.stop()
                 flash("Measurement stopped", "success")
@@ -57,7 +91,8 @@ def dashboard():
 
     state = controller.get_state()
     instruments = controller.list_instruments()
-    instrument = controller.instrument
+    # connect button state of the selected address
+    instrument = controller.instruments.get(controller.instrument_addr)
     device_types = controller.device_types
     config_files = controller.list_config_files()
 
@@ -66,6 +101,7 @@ def dashboard():
         state=state,
         instruments=instruments,
         instrument=instrument,
+        connected=controller.instrument_types,
         device_types=device_types,
         channel_options=CHANNEL_OPTIONS,
         config_files=config_files,
@@ -74,20 +110,45 @@ def dashboard():
     )
 
 
+def _time_arg(name):
+    """ISO timestamp query argument in epoch ns, None if missing or invalid."""
+    value = request.args.get(name)
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1e9) if value else None
+    except ValueError:
+        return None
+
+
+def _range_args() -> dict:
+    return {
+        "start_ns": _time_arg("start"),
+        "end_ns": _time_arg("end"),
+        "span_s": request.args.get("span", type=float),
+    }
+
+
 @views.route("/chart.png")
 def chart_png():
-    data = controller.build_chart_png()
-    return send_file(BytesIO(data), mimetype="image/png")
+    # ?start=<iso>&end=<iso> or ?span=<seconds> select the range, ?width=<px>
+    width = max(200, min(request.args.get("width", 800, type=int), 4000))
+    data = controller.build_chart_png(width=width, **_range_args())
+    # a plain response, send_file would skip the close hook of the latency metric
+    return Response(data, mimetype="image/png")
 
 
 @views.route("/export.csv")
 def export_csv():
-    data = controller.build_csv()
-    return send_file(
-        BytesIO(data),
+    # optional ?channels=1,2,3 and ?start=<iso>&end=<iso> or ?span=<seconds>
+    channels = request.args.get("channels")
+    try:
+        channels = [int(ch) for ch in channels.split(",")] if channels else None
+    except ValueError:
+        return ("Invalid channel list", 400)
+    rows = controller.iter_csv(channels=channels, **_range_args())
+    return Response(
+        rows,
         mimetype="text/csv",
-        as_attachment=True,
-        download_name="measurements.csv",
+        headers={"Content-Disposition": "attachment; filename=measurements.csv"},
     )
 
 
@@ -96,17 +157,76 @@ def selection_changed():
     data = request.get_json(silent=True) or request.form
     new_device_type = data.get("device_type") or controller.device_type
     new_addr = data.get("instrument_address") or controller.instrument_addr
-    if (
-        new_device_type != controller.device_type
-        or new_addr != controller.instrument_addr
-    ):
-        # Close current instrument and update selection
-        controller.close()
-        controller.device_type = new_device_type
-        controller.instrument_addr = new_addr
+    # other instruments stay connected, the selection only picks the next one
+    controller.device_type = new_device_type
+    controller.instrument_addr = new_addr
     return ("", 204)
 
 
 @views.route("/api/state")
 def api_state():
-    return controller.get_series()
+    # ?since=<seq>&run=<run> only returns the samples added since the last poll,
+    # ?width=<px> returns the (?start, ?end or ?span) range decimated to the width
+    return controller.get_series(
+        since=request.args.get("since", type=int),
+        run=request.args.get("run"),
+        width=request.args.get("width", type=int),
+        **_range_args(),
+    )
+
+
+@views.route("/api/timing")
+def api_timing():
+    # scan duration, start lateness/jitter (seconds) and overrun counters
+    return controller.timing.summary()
+
+
+@views.route("/api/plan")
+def api_plan():
+    # channel groups per instrument and the setting changes they cost per cycle
+    return controller.plan_summary()
+
+
+@views.route("/api/reprocess", methods=["POST"])
+def api_reprocess():
+    # ?run=<run id> recomputes the values of a run (the current one by default)
+    # from its raw readings with the current sensor coefficients
+    run_id = request.args.get("run") or controller.store.run_id
+    started = time.perf_counter()
+    try:
+        rows = controller.reprocess(run_id)
+    except RuntimeError as e:
+        return ({"error": str(e)}, 409)
+    return {"run": run_id, "rows": rows, "seconds": time.perf_counter() - started}
+
+
+@views.route("/metrics")
+def metrics():
+    # Prometheus text exposition format
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@views.route("/api/stream")
+def api_stream():
+    """Server-Sent Events stream of every completed scan."""
+    q = controller.broadcaster.subscribe()
+
+    def events():
+        try:
+            while True:
+                try:
+                    message = q.get(timeout=15)
+                except queue.Empty:
+                    # keeps proxies from closing the idle connection and detects
+                    # clients that went away
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            controller.broadcaster.unsubscribe(q)
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,340 @@
+"""Minimal Prometheus style metrics without external dependencies.
+
+Counter, Gauge and Histogram follow the prometheus_client API (labels(),
+inc(), set(), observe(), time()) and REGISTRY.render() returns all metrics in
+the Prometheus text exposition format. Updates only take a short lock, so they
+can be used on the acquisition thread.
+
+MeteredResource wraps a pyvisa resource and records the round-trip time of
+every command and the VISA errors; TimedLock is a lock that records the time
+spent waiting for it.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pyvisa
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: Registry = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._child()
+        registry.register(self)
+
+    def labels(self, *values, **kwargs):
+        """The child metric of one label combination."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            children = list(self._children.items())
+        lines = []
+        for key, child in children:
+            lines.extend(child.collect(self.name, self.labelnames, key))
+        return lines
+
+    # metrics without labels are used directly
+    def __getattr__(self, attr):
+        if attr.startswith("_") or self.labelnames:
+            raise AttributeError(attr)
+        return getattr(self._children[()], attr)
+
+
+class _CounterValue:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def collect(self, name, labelnames, key):
+        return [f"{name}{_labels(labelnames, key)} {_format(self._value)}"]
+
+
+class _GaugeValue(_CounterValue):
+    def __init__(self):
+        super().__init__()
+        self._function: Optional[Callable[[], float]] = None
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, function: Callable[[], float]):
+        """Evaluate function at every scrape instead of storing a value."""
+        self._function = function
+
+    def collect(self, name, labelnames, key):
+        value = self._value
+        if self._function is not None:
+            try:
+                value = float(self._function())
+            except Exception:
+                value = math.nan
+        return [f"{name}{_labels(labelnames, key)} {_format(value)}"]
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def collect(self, name, labelnames, key):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format(bound)}"'
+            lines.append(f"{name}_bucket{_labels(labelnames, key, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, key)} {_format(total)}")
+        lines.append(f"{name}_count{_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: _HistogramValue):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterValue()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeValue()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Registry = REGISTRY,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+
+# ---- Instrumentation helpers ------------
+VISA_COMMAND_SECONDS = Histogram(
+    "outgassing_visa_command_seconds",
+    "Round-trip time of VISA commands (config: writes, read: reading queries).",
+    ["instrument", "kind"],
+)
+VISA_ERRORS = Counter(
+    "outgassing_visa_errors_total",
+    "VISA errors of instrument commands.",
+    ["instrument", "error"],
+)
+
+READ_QUERIES = ("READ?", "FETC?", "FETCH?", "TRAC:DATA?")
+
+
+def _kind(command: str) -> str:
+    """Metric kind of a query, "read" if any of its ;-separated commands
+    returns readings (READ?, FETC?, TRAC:DATA?, CALC...?) or triggers them
+    (INIT), e.g. "TRAC:FEED:CONT NEXT;:INIT;*OPC?"."""
+    for part in command.upper().split(";"):
+        header = part.strip().lstrip(":").split(" ")[0]
+        if header in READ_QUERIES or header in ("INIT", "INIT:IMM"):
+            return "read"
+        if header.startswith("CALC") and header.endswith("?"):
+            return "read"
+    return "query"
+
+
+class MeteredResource:
+    """pyvisa resource proxy recording command round-trip times and errors."""
+
+    def __init__(self, resource, instrument: str):
+        self.__dict__["_resource"] = resource
+        self.__dict__["_instrument"] = instrument
+
+    def _call(self, kind: str, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except pyvisa.errors.VisaIOError as e:
+            timeout = e.error_code == pyvisa.constants.StatusCode.error_timeout
+            VISA_ERRORS.labels(self._instrument, "timeout" if timeout else "io").inc()
+            raise
+        except pyvisa.errors.InvalidBinaryFormat:
+            VISA_ERRORS.labels(self._instrument, "format").inc()
+            raise
+        finally:
+            VISA_COMMAND_SECONDS.labels(self._instrument, kind).observe(
+                time.perf_counter() - started
+            )
+
+    def write(self, command: str, *args, **kwargs):
+        return self._call("config", self._resource.write, command, *args, **kwargs)
+
+    def query(self, command: str, *args, **kwargs):
+        return self._call(
+            _kind(command), self._resource.query, command, *args, **kwargs
+        )
+
+    def __getattr__(self, attr):
+        method = getattr(self._resource, attr)
+        if attr == "query_binary_values":
+            # only resources that support binary transfers get the wrapper
+            return lambda command, *args, **kwargs: self._call(
+                _kind(command), method, command, *args, **kwargs
+            )
+        return method
+
+    def __setattr__(self, attr, value):
+        # e.g. timeout is set on the wrapped resource
+        setattr(self._resource, attr, value)
+
+
+class TimedLock:
+    """threading.Lock that records the time spent waiting for it."""
+
+    def __init__(self, histogram):
+        self._lock = threading.Lock()
+        self._histogram = histogram
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self._histogram.observe(0.0)
+            return True
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._histogram.observe(time.perf_counter() - started)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
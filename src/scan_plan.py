@@ -0,0 +1,76 @@
+"""Execution plans of the channels read one after the other.
+
+Reading channels in the order 1..N reconfigures the meter between almost every
+reading when their configurations are mixed. compile_plan groups the channels
+of an instrument by their measurement setting (everything the meter has to be
+reconfigured for, e.g. the raw function "Resistance" shared by PT100 and NTC
+channels), so every setting is applied once per cycle. Plans are cached per
+channel configuration, and a cycle starts with the group of the setting the
+meter is still in from the previous cycle.
+"""
+
+from functools import lru_cache
+from typing import Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+Setting = Hashable
+
+
+class ScanPlan(NamedTuple):
+    # (setting, channels) in execution order, channels ascending within a group
+    groups: Tuple[Tuple[Setting, Tuple[int, ...]], ...]
+    # setting changes per cycle in steady state, with the plan and in channel order
+    reconfigurations: int
+    channel_order: int
+
+    def rotated(self, current: Optional[Setting] = None):
+        """Groups starting with the group of the current setting of the meter."""
+        for i, (setting, _) in enumerate(self.groups):
+            if setting == current:
+                return self.groups[i:] + self.groups[:i]
+        return self.groups
+
+    def order(self, current: Optional[Setting] = None) -> List[Tuple[int, Setting]]:
+        """(channel, setting) in execution order, see rotated()."""
+        return [
+            (ch, setting)
+            for setting, channels in self.rotated(current)
+            for ch in channels
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "groups": [
+                {"setting": str(setting), "channels": list(channels)}
+                for setting, channels in self.groups
+            ],
+            "reconfigurations": self.reconfigurations,
+            "channel_order": self.channel_order,
+        }
+
+
+def switches(settings: Sequence[Setting]) -> int:
+    """Setting changes of one cycle in the given order, including the change
+    back to the first setting at the start of the next cycle."""
+    if not settings:
+        return 0
+    changes = sum(a != b for a, b in zip(settings, settings[1:]))
+    return changes + (settings[-1] != settings[0])
+
+
+@lru_cache(maxsize=256)
+def compile_plan(channel_settings: Tuple[Tuple[int, Setting], ...]) -> ScanPlan:
+    """Plan of the ((channel, setting), ...) read in one cycle.
+
+    Groups are ordered by their first channel; rotating them in order() keeps
+    the steady state at one change per group boundary.
+    """
+    groups = {}
+    for ch, setting in sorted(channel_settings):
+        groups.setdefault(setting, []).append(ch)
+    return ScanPlan(
+        groups=tuple(
+            (setting, tuple(channels)) for setting, channels in groups.items()
+        ),
+        reconfigurations=max(len(groups) - 1, 0),
+        channel_order=switches([setting for _, setting in sorted(channel_settings)]),
+    )
@@ -0,0 +1,197 @@
+"""Timing of the acquisition loops.
+
+* ChannelScheduler -- per-channel sample rates. Every channel has its own
+  interval; a priority queue of next-due times tells the loop which channels
+  have to be measured in a cycle and when the next one is due, so slow channels
+  (e.g. temperatures read once a minute) leave the shared instrument free for
+  the fast ones.
+* DeadlineTimer -- fixed-rate loop on absolute monotonic deadlines, so the
+  period does not drift by the scan time.
+* TimingStats -- scan duration, jitter and overrun counters of either loop.
+"""
+
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class ChannelScheduler:
+    """Priority queue of the next due time (monotonic seconds) of every channel."""
+
+    def __init__(self):
+        self._intervals: Dict[int, float] = {}
+        self._next: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+        # readings dropped because a channel fell behind by whole intervals
+        self.dropped = 0
+
+    def configure(self, intervals: Dict[int, float], now: float):
+        """Set the channels to schedule and their intervals in seconds.
+
+        New channels and channels whose interval changed are due immediately,
+        the others keep their phase.
+        """
+        for ch in list(self._intervals):
+            if ch not in intervals:
+                del self._intervals[ch]
+                del self._next[ch]
+        for ch, interval in intervals.items():
+            if self._intervals.get(ch) != interval:
+                self._intervals[ch] = interval
+                self._next[ch] = now
+                heapq.heappush(self._heap, (now, ch))
+
+    def due(self, now: float) -> List[int]:
+        """Pop the channels due at now and schedule their next reading.
+
+        The next reading keeps the channel's phase; a channel that fell behind
+        by a whole interval is not caught up but rescheduled from now.
+        """
+        channels = []
+        while self._heap and self._heap[0][0] <= now:
+            due, ch = heapq.heappop(self._heap)
+            if self._next.get(ch) != due:
+                continue  # stale entry of a removed or reconfigured channel
+            channels.append(ch)
+            next_due = due + self._intervals[ch]
+            if next_due <= now:
+                self.dropped += int((now - due) // self._intervals[ch])
+                next_due = now + self._intervals[ch]
+            self._next[ch] = next_due
+            heapq.heappush(self._heap, (next_due, ch))
+        return sorted(channels)
+
+    def next_due(self) -> Optional[float]:
+        """Time the next channel is due, None if no channel is scheduled."""
+        while self._heap and self._next.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+
+class TimingStats:
+    """Scan duration, jitter and overrun counters of a scheduled loop.
+
+    Every cycle is recorded with its deadline and its start and end time
+    (monotonic seconds). Lateness is the delay of the start after the deadline,
+    jitter the deviation of the time between two starts from the time between
+    their deadlines. Distributions are kept for the last ``window`` cycles.
+
+    Missed work is counted in its own unit: skipped_cycles are deadlines of the
+    fixed-rate loop that were dropped, dropped_readings are single channel
+    readings the per-channel scheduler did not catch up.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._durations: deque = deque(maxlen=window)
+        self._lateness: deque = deque(maxlen=window)
+        self._jitter: deque = deque(maxlen=window)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.cycles = 0
+            self.overruns = 0
+            self.skipped_cycles = 0
+            self.dropped_readings = 0
+            self._durations.clear()
+            self._lateness.clear()
+            self._jitter.clear()
+            self._previous: Optional[Tuple[float, float]] = None
+
+    def record(
+        self,
+        deadline: float,
+        started: float,
+        finished: float,
+        overrun: bool = False,
+        skipped_cycles: int = 0,
+        dropped_readings: int = 0,
+    ):
+        with self._lock:
+            self.cycles += 1
+            self.overruns += int(overrun)
+            self.skipped_cycles += skipped_cycles
+            self.dropped_readings += dropped_readings
+            self._durations.append(finished - started)
+            self._lateness.append(started - deadline)
+            if self._previous is not None:
+                prev_deadline, prev_started = self._previous
+                self._jitter.append(
+                    (started - prev_started) - (deadline - prev_deadline)
+                )
+            self._previous = (deadline, started)
+
+    def summary(self) -> dict:
+        """Counters and mean/p95/max of duration, lateness and |jitter| in s."""
+        with self._lock:
+            return {
+                "cycles": self.cycles,
+                "overruns": self.overruns,
+                "skipped_cycles": self.skipped_cycles,
+                "dropped_readings": self.dropped_readings,
+                "scan_duration": _describe(self._durations),
+                "lateness": _describe(self._lateness),
+                "jitter": _describe(np.abs(np.array(self._jitter))),
+            }
+
+
+class DeadlineTimer:
+    """Fixed-rate loop timing on absolute monotonic deadlines.
+
+    Call wait() at the start and done() at the end of every cycle. Deadlines
+    are start + k * period, so the period does not drift by the scan time. If
+    a scan overruns one or more deadlines, they are coalesced into a single
+    cycle that starts right away instead of being run back to back.
+    """
+
+    def __init__(self, period: float, stats: Optional[TimingStats] = None):
+        self.period = period
+        self.stats = stats if stats is not None else TimingStats()
+        self._next: Optional[float] = None
+        self._deadline = 0.0
+        self._started = 0.0
+
+    def wait(self) -> float:
+        """Sleep until the next deadline and return the start time of the cycle."""
+        now = time.monotonic()
+        if self._next is None:
+            self._next = now
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._deadline = self._next
+        self._started = time.monotonic()
+        return self._started
+
+    def done(self):
+        """Record the finished cycle and schedule the next deadline."""
+        finished = time.monotonic()
+        missed = int((finished - self._deadline) // self.period)
+        if missed >= 1:
+            # start the latest missed deadline now, drop the ones before it
+            self._next = self._deadline + missed * self.period
+        else:
+            self._next = self._deadline + self.period
+        self.stats.record(
+            self._deadline,
+            self._started,
+            finished,
+            overrun=missed >= 1,
+            skipped_cycles=max(missed - 1, 0),
+        )
+
+
+def _describe(values) -> Optional[dict]:
+    if len(values) == 0:
+        return None
+    values = np.asarray(values, dtype=float)
+    return {
+        "last": float(values[-1]),
+        "mean": float(values.mean()),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
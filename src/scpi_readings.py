@@ -0,0 +1,122 @@
+"""Decoding of instrument readings into NumPy arrays.
+
+* parse_ascii -- comma separated ASCII readings (scan lists, buffers). Plain
+  numbers are converted straight into the array; only responses with units or
+  other elements (e.g. "+1.23E+00VDC,  0INTCHAN") fall back to a per-item
+  regex.
+* decode_binary -- IEEE754 readings as sent with FORM:DATA DREAL/SREAL by the
+  Keithley 2000, where every reading is preceded by a "#0" header.
+* parse_statistics -- mean/std/min/max of averaged channels, answered by the
+  instrument to one compound query.
+
+Overflow readings (+9.9E37) and items that are not a number become NaN.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+# Readings at or above this magnitude are the instruments' overflow marker
+OVERFLOW = 9.9e37
+
+
+class Statistics(NamedTuple):
+    """Statistics of the readings an instrument took of one channel."""
+
+    mean: float
+    std: float
+    min: float
+    max: float
+    count: int
+
+
+_NUMBER = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+
+
+def parse_ascii(response: str) -> np.ndarray:
+    """Readings of a comma separated response as float64 array."""
+    items = response.split(",")
+    try:
+        if len(items) == 1:
+            # single readings skip the array operations of the overflow check
+            value = float(items[0])
+            return np.array([value if abs(value) < OVERFLOW else np.nan])
+        values = np.fromiter(map(float, items), dtype=float, count=len(items))
+    except ValueError:
+        values = np.array([_parse_item(item) for item in items], dtype=float)
+    return _mask_overflow(values)
+
+
+def decode_binary(
+    block,
+    size: int = 8,
+    header: bytes = b"#0",
+    big_endian: bool = False,
+    count: Optional[int] = None,
+) -> np.ndarray:
+    """Readings of a binary block with a header in front of every reading.
+
+    block are the raw bytes (or a uint8 array) of size-byte IEEE754 values,
+    each preceded by header; trailing whitespace (the termination) is ignored.
+    ValueError if a record does not start with header, if other bytes follow
+    the records or if count readings were expected but not received (e.g. an
+    ASCII response).
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    stride = len(header) + size
+    end = len(data) // stride * stride
+    records = data[:end].reshape(-1, stride)
+    if bytes(data[end:]).strip():
+        raise ValueError(f"Invalid binary block: {len(data)} bytes")
+    if count is not None and len(records) != count:
+        raise ValueError(f"Invalid binary block: {len(records)} of {count} readings")
+    headers = records[:, : len(header)]
+    if not (headers == np.frombuffer(header, dtype=np.uint8)).all():
+        raise ValueError("Invalid binary block: reading header missing")
+    dtype = np.dtype(f"{'>' if big_endian else '<'}f{size}")
+    values = records[:, len(header) :].copy().view(dtype).ravel()
+    return _mask_overflow(values.astype(float))
+
+
+def first_reading(values: np.ndarray) -> Optional[float]:
+    """First reading as float, None if there is none or it is invalid."""
+    if len(values) == 0:
+        return None
+    value = float(values[0])
+    return None if value != value else value
+
+
+def to_list(values: np.ndarray) -> List[Optional[float]]:
+    """Readings as list with None for invalid readings."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def parse_statistics(response: str, count: int) -> List[Optional[Statistics]]:
+    """Statistics of every channel of a compound response "means;stds;mins;maxs"
+    (optionally ";counts"), each part holding one reading per channel.
+
+    count is used if the response has no counts; channels without a valid mean
+    are None.
+    """
+    parts = [parse_ascii(part) for part in response.strip().split(";")]
+    if len(parts) < 4 or len({len(part) for part in parts}) != 1:
+        raise ValueError(f"Invalid statistics response: {response!r}")
+    means, stds, mins, maxs = (part.tolist() for part in parts[:4])
+    counts = parts[4].tolist() if len(parts) > 4 else [count] * len(means)
+    return [
+        None if mean != mean else Statistics(mean, std, low, high, int(n))
+        for mean, std, low, high, n in zip(means, stds, mins, maxs, counts)
+    ]
+
+
+def _parse_item(item: str) -> float:
+    match = _NUMBER.match(item)
+    return float(match.group(1)) if match else np.nan
+
+
+def _mask_overflow(values: np.ndarray) -> np.ndarray:
+    overflow = np.abs(values) >= OVERFLOW
+    if overflow.any():
+        values[overflow] = np.nan
+    return values
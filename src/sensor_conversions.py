@@ -0,0 +1,150 @@
+"""Conversion of raw readings into sensor values.
+
+Every sensor configuration is registered once with the raw measurement
+function it is read with (SCPI function name, e.g. "RES") and a conversion
+that works on whole NumPy arrays, so scan lists and buffered readings are
+converted in one call. Readings that cannot be converted (out of the sensor's
+range, missing) become NaN.
+"""
+
+from typing import Callable, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+Conversion = Callable[[np.ndarray], np.ndarray]
+
+
+class Sensor(NamedTuple):
+    name: str
+    function: str  # raw measurement function, "RES" or "VOLT:DC"
+    convert: Conversion
+    unit: str = ""
+
+
+SENSORS: Dict[str, Sensor] = {}
+
+
+def register(name: str, function: str, convert: Conversion, unit: str = ""):
+    """Add or replace the sensor configuration name."""
+    SENSORS[name] = Sensor(name, function, convert, unit)
+
+
+# ---- Conversion functions ------------
+def callendar_van_dusen(A: float, B: float, R_0: float) -> Conversion:
+    """Platinum RTD temperature in °C for t >= 0 from the resistance:
+    t = (-A R_0 + sqrt((A R_0)^2 - 4 B R_0 (R_0 - R))) / (2 B R_0)"""
+
+    def convert(resistance):
+        discriminant = A**2 * R_0**2 - 4 * B * R_0 * (R_0 - resistance)
+        return (-A * R_0 + np.sqrt(discriminant)) / (2 * B * R_0)
+
+    return convert
+
+
+def steinhart_hart(A: float, B: float, C: float) -> Conversion:
+    """Thermistor temperature in °C from the resistance:
+    1/T = A + B ln(R) + C ln(R)^3"""
+
+    def convert(resistance):
+        log_resistance = np.log(resistance)
+        inv_temp = A + B * log_resistance + C * log_resistance**3
+        return 1 / inv_temp - 273.15
+
+    return convert
+
+
+def power_law(factor: float, exponent: float) -> Conversion:
+    """factor * x^exponent, e.g. the pressure of a gauge from its voltage."""
+    return lambda x: factor * x**exponent
+
+
+# Plain configuration measuring the raw signal of a sensor's function
+RAW_CONFIGS = {"RES": "Resistance", "VOLT:DC": "Voltage"}
+# Configuration of temperatures in °C converted by the instrument itself (e.g.
+# RTDs and thermistors of the DAQ970A), stored without conversion
+TEMPERATURE = "Temperature"
+
+
+def raw_config(config: str) -> str:
+    """Configuration that measures the raw signal of a sensor configuration."""
+    sensor = SENSORS.get(config)
+    return RAW_CONFIGS.get(sensor.function, config) if sensor else config
+
+
+register("PT100", "RES", callendar_van_dusen(3.9827e-3, -5.875e-7, 100.0), "°C")
+register("NTC_44006", "RES", steinhart_hart(1.032e-3, 2.387e-4, 1.580e-7), "°C")
+register("NTC_44007", "RES", steinhart_hart(1.285e-3, 2.362e-4, 9.285e-8), "°C")
+register("IKR020", "VOLT:DC", power_law(9e-14, 9.6465), "mbar")
+
+
+# ---- Conversion of readings ------------
+def convert(config: str, raw) -> np.ndarray:
+    """Sensor values of an array of raw readings, NaN where not convertible.
+
+    Configurations without a registered sensor return the readings unchanged.
+    """
+    raw = np.asarray(raw, dtype=float)
+    sensor = SENSORS.get(config)
+    if sensor is None:
+        return raw
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        values = np.asarray(sensor.convert(raw), dtype=float)
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def convert_value(config: str, raw: Optional[float]) -> Optional[float]:
+    """Sensor value of a single reading, None if it is missing or invalid."""
+    if raw is None:
+        return None
+    sensor = SENSORS.get(config)
+    if sensor is None:
+        return raw
+    # NumPy scalars keep the array semantics (NaN instead of errors) but
+    # avoid the array overhead
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        value = float(sensor.convert(np.float64(raw)))
+    return value if np.isfinite(value) else None
+
+
+def convert_readings(
+    configs: Sequence[str], raw: Sequence[Optional[float]]
+) -> np.ndarray:
+    """Sensor values of readings with one configuration per reading.
+
+    The readings of every configuration are converted in one vectorized call;
+    None readings become NaN.
+    """
+    raw = np.array(raw, dtype=float)  # None becomes NaN
+    values = raw.copy()
+    groups: Dict[str, list] = {}
+    for i, config in enumerate(configs):
+        if config in SENSORS:
+            groups.setdefault(config, []).append(i)
+    for config, index in groups.items():
+        values[index] = convert(config, raw[index])
+    return values
+
+
+def convert_statistics(configs: Sequence[str], stats) -> np.ndarray:
+    """Sensor values of rows of raw (mean, std, min, max) statistics.
+
+    The standard deviation is scaled with the slope of the conversion around
+    the mean; min and max are swapped for falling conversions (thermistors).
+    Returns an array with one (mean, std, min, max) row per configuration.
+    """
+    stats = np.array(stats, dtype=float).reshape(-1, 4)
+    values = stats.copy()
+    groups: Dict[str, list] = {}
+    for i, config in enumerate(configs):
+        if config in SENSORS:
+            groups.setdefault(config, []).append(i)
+    for config, index in groups.items():
+        mean, std, low, high = stats[index].T
+        lower, upper = convert(config, mean - std), convert(config, mean + std)
+        low, high = convert(config, low), convert(config, high)
+        values[index, 0] = convert(config, mean)
+        values[index, 1] = np.abs(upper - lower) / 2
+        values[index, 2] = np.minimum(low, high)
+        values[index, 3] = np.maximum(low, high)
+    return values
@@ -0,0 +1,576 @@
+"""In-process simulated instruments for testing without the test rig.
+
+SimulatedResource stands in for a pyvisa message based resource (write, query,
+query_binary_values, timeout, close) and understands the SCPI subset used by the Keithley2000 and
+KeysightDAQ970A drivers. It models
+
+* the bus latency of every command (fixed latency plus time per byte),
+* the settle time of the scanner relays (readings taken too early still show a
+  transient from the previously closed channel),
+* the integration time (NPLC, autozero, line frequency) and its noise,
+* the scan list of the DAQ970A (CONF redefines it, INIT/FETC? scan it),
+* the trigger model of the Keithley 2000 (internal scan ROUT:SCAN:INT and
+  LSEL, SAMP:COUN, TRIG:COUN, the TRAC buffer and *OPC?),
+* the binary reading format of the Keithley 2000 (FORM:DATA SREAL/DREAL,
+  FORM:BORD, a "#0" header in front of every reading),
+* the statistics of averaged readings (CALC:AVER of the DAQ970A over the
+  sweeps of SAMP:COUN, CALC2 of the Keithley 2000 over the buffer) and *WAI,
+* the temperature measurement of the DAQ970A (CONF:TEMP RTD/FRTD/THER), which
+  converts the resistance signal of the channel with its transducer type,
+* a configurable waveform per channel.
+
+Simulated instruments use addresses like "SIM::Keithley2000::INSTR".
+"""
+
+import math
+import random
+import re
+import statistics
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import pyvisa
+
+from sensor_conversions import callendar_van_dusen, steinhart_hart
+
+SIM_PREFIX = "SIM::"
+SIM_MODELS = ("Keithley2000", "KeysightDAQ970A")
+SIM_ADDRESSES = [f"{SIM_PREFIX}{model}::INSTR" for model in SIM_MODELS]
+
+IDN = {
+    "Keithley2000": "KEITHLEY INSTRUMENTS INC.,MODEL 2000,SIM0001,A20 /A02",
+    "KeysightDAQ970A": "Keysight Technologies,DAQ970A,SIM0001,A.03.02",
+}
+
+Waveform = Callable[[float], float]
+
+
+# ---- Waveforms (t in seconds since the resource was opened) ------------
+def constant(value: float) -> Waveform:
+    return lambda t: value
+
+
+def ramp(start: float, slope: float) -> Waveform:
+    return lambda t: start + slope * t
+
+
+def sine(
+    offset: float, amplitude: float = 0.0, period: float = 600.0, noise: float = 0.0
+) -> Waveform:
+    """offset + amplitude * sin(2 pi t / period) plus gaussian noise."""
+    rng = random.Random()
+
+    def wave(t):
+        value = offset + amplitude * math.sin(2 * math.pi * t / period)
+        return value + rng.gauss(0.0, noise) if noise else value
+
+    return wave
+
+
+# Signal of channels without an own waveform, by measurement function
+DEFAULT_WAVEFORMS = {
+    "VOLT:DC": sine(1.0, 0.2, 600.0, 1e-4),
+    "CURR:DC": sine(1e-3, 1e-4, 600.0, 1e-8),
+    "RES": sine(10e3, 500.0, 1800.0, 0.05),
+    "FREQ": sine(1e3, 10.0, 300.0, 0.01),
+    # resistance of RTDs, thermistors use the RES signal
+    "RTD": sine(108.0, 0.5, 1800.0, 0.005),
+}
+
+# Resistance to °C of the transducer types of CONF:TEMP <type>,<parameter>
+TRANSDUCERS = {
+    ("RTD", 85): callendar_van_dusen(3.9083e-3, -5.775e-7, 100.0),
+    ("RTD", 91): callendar_van_dusen(3.9687e-3, -5.870e-7, 100.0),
+    ("THER", 2252): steinhart_hart(1.468e-3, 2.383e-4, 1.007e-7),
+    ("THER", 5000): steinhart_hart(1.285e-3, 2.362e-4, 9.285e-8),
+    ("THER", 10000): steinhart_hart(1.032e-3, 2.387e-4, 1.580e-7),
+}
+# default parameter of a transducer type
+TRANSDUCER_DEFAULTS = {"RTD": 85, "FRTD": 85, "THER": 5000}
+
+# Integration time multiplier with autozero on and aperture of the frequency
+# counter in seconds
+MODEL_TIMING = {
+    "Keithley2000": {"autozero_factor": 3, "freq_aperture": 1.0},
+    "KeysightDAQ970A": {"autozero_factor": 2, "freq_aperture": 0.1},
+}
+
+
+def is_simulated(address: str) -> bool:
+    return address.upper().startswith(SIM_PREFIX)
+
+
+def open_simulated(address: str, **kwargs) -> "SimulatedResource":
+    """Opens the simulated instrument of an address like SIM::<model>::INSTR."""
+    parts = address.split("::")
+    model = parts[1] if len(parts) > 2 else ""
+    if model not in SIM_MODELS:
+        raise ValueError(f"Unknown simulated instrument: {address}")
+    return SimulatedResource(model, address, **kwargs)
+
+
+def _number(command: str) -> float:
+    """First numeric parameter of a command like SENS:VOLT:NPLC 10,(@101)."""
+    return float(re.split(r"[ ,]+", command.split(" ", 1)[1].strip())[0])
+
+
+def _statistic(name: str, readings: List[float]) -> float:
+    """MEAN/AVER, SDEV, MIN, MAX or COUN of readings, the overflow marker
+    9.91E37 if there are none."""
+    if not readings:
+        return 9.91e37
+    name = name[:3]
+    if name in ("MEA", "AVE"):
+        return statistics.fmean(readings)
+    if name == "SDE":
+        return statistics.stdev(readings) if len(readings) > 1 else 0.0
+    if name == "MIN":
+        return min(readings)
+    if name == "MAX":
+        return max(readings)
+    return float(len(readings))
+
+
+def _channel_list(text: str) -> List[int]:
+    """Channels of a SCPI channel list like (@101,103:105)."""
+    match = re.search(r"\(@([^)]*)\)", text)
+    if not match:
+        return []
+    channels = []
+    for item in match.group(1).split(","):
+        if ":" in item:
+            first, last = item.split(":")
+            channels.extend(range(int(first), int(last) + 1))
+        elif item.strip():
+            channels.append(int(item))
+    return channels
+
+
+class SimulatedResource:
+    """Simulated Keithley 2000 or DAQ970A behind the pyvisa resource interface.
+
+    Arguments:
+    model          -- "Keithley2000" or "KeysightDAQ970A"
+    waveforms      -- {instrument channel: waveform} of the measured signals
+    bus_latency    -- seconds every command takes on the bus
+    byte_time      -- additional seconds per transferred byte (e.g. 1/960 at 9600 baud)
+    relay_settle   -- settle time of the scanner relays in seconds
+    line_frequency -- power line frequency in Hz
+    time_scale     -- factor for all simulated delays, 0 returns immediately
+    """
+
+    def __init__(
+        self,
+        model: str = "Keithley2000",
+        address: Optional[str] = None,
+        waveforms: Optional[Dict[int, Waveform]] = None,
+        bus_latency: float = 0.002,
+        byte_time: float = 0.0,
+        relay_settle: float = 0.01,
+        line_frequency: float = 50.0,
+        time_scale: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.model = model
+        self.resource_name = address or f"{SIM_PREFIX}{model}::INSTR"
+        self.waveforms = dict(waveforms or {})
+        self.bus_latency = bus_latency
+        self.byte_time = byte_time
+        self.relay_settle = relay_settle
+        self.line_frequency = line_frequency
+        self.time_scale = time_scale
+        self.timeout = 2000
+        self.command_count = 0
+        self._timing = MODEL_TIMING[model]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        # the TRAC buffer of the Keithley 2000 is not affected by *RST
+        self.buffer: List[float] = []
+        self.buffer_points = 100
+        self._reset()
+
+    # ---- pyvisa resource interface ------------
+    def write(self, command: str):
+        with self._lock:
+            self._transfer(command)
+            for part in command.split(";"):
+                if not part.strip():
+                    continue
+                try:
+                    self._execute(part.strip())
+                except ValueError:
+                    self.errors.append('-100,"Command error"')
+        return len(command)
+
+    def query(self, command: str) -> str:
+        with self._lock:
+            self._transfer(command)
+            # the responses of a compound query are joined by ";"
+            responses = []
+            for part in command.split(";"):
+                if part.strip():
+                    response = self._execute(part.strip())
+                    if response:
+                        responses.append(response)
+            response = responses[-1] if responses else None
+            if len(responses) > 1 and all(isinstance(r, str) for r in responses):
+                response = ";".join(responses)
+            if response is None:
+                # unknown queries are not answered, like on the real instrument
+                raise pyvisa.errors.VisaIOError(
+                    pyvisa.constants.StatusCode.error_timeout
+                )
+            self._transfer(response)
+            if isinstance(response, bytes):
+                # binary readings are not meant to be read as text
+                return response.decode("latin-1")
+            return response
+
+    def query_binary_values(
+        self,
+        message: str,
+        datatype: str = "f",
+        is_big_endian: bool = False,
+        container=list,
+        header_fmt: str = "ieee",
+        expect_termination: bool = True,
+        data_points: int = -1,
+        chunk_size: Optional[int] = None,
+    ):
+        """Binary query like pyvisa's, for the header formats ieee and empty."""
+        with self._lock:
+            self._transfer(message)
+            response = self._execute(message.strip())
+            if response is None:
+                raise pyvisa.errors.VisaIOError(
+                    pyvisa.constants.StatusCode.error_timeout
+                )
+            block = response if isinstance(response, bytes) else response.encode()
+            self._transfer(block)
+        if header_fmt == "ieee":
+            offset, length = pyvisa.util.parse_ieee_block_header(block)
+        elif header_fmt == "empty":
+            offset, length = 0, -1
+        else:
+            raise ValueError(f"Unsupported header format: {header_fmt}")
+        if length < 0:
+            # no length in the header, e.g. the "#0" of the Keithley 2000
+            size = struct.calcsize(datatype)
+            length = data_points * size if data_points > 0 else len(block) - offset
+        if offset + length > len(block):
+            # the instrument sent less than expected, the read times out
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+        return pyvisa.util.from_binary_block(
+            block, offset, length, datatype, is_big_endian, container
+        )
+
+    def close(self):
+        pass
+
+    # ---- internal model ------------
+    def _reset(self):
+        self.function = "VOLT:DC"
+        self.nplc: Dict[str, float] = {}
+        self.autozero = True
+        self.aperture: Optional[float] = None  # gate time of FREQ, model default
+        self.functions: Dict[int, str] = {}  # per channel function of the DAQ
+        self.transducers: Dict[int, tuple] = {}  # (type, parameter) of TEMP
+        self.scan_list: List[int] = []
+        self.closed: Optional[int] = None
+        self.closed_at = 0.0
+        self.previous_value = 0.0
+        self.errors: List[str] = []
+        self._fetch: Optional[List[float]] = None
+        self._fetch_ready = 0.0
+        self.data_format = "ASCII"  # or SREAL/DREAL of the Keithley 2000
+        self.swapped = False
+        # (channel, reading) of the last INIT, the DAQ970A's statistics
+        self.scan_readings: List[tuple] = []
+        self.calc2_format = "NONE"
+        self.calc2_enabled = False
+        self.calc2_result = 0.0
+        self._reset_trigger_model()
+
+    def _reset_trigger_model(self):
+        """One-shot readings of the Keithley 2000 after *RST and CONF."""
+        self.scan_enabled = False  # ROUT:SCAN:LSEL INT
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.buffer_armed = False  # TRAC:FEED:CONT NEXT
+
+    def _delay(self, seconds: float):
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _transfer(self, message: str):
+        self.command_count += 1
+        self._delay(self.bus_latency + self.byte_time * (len(message) + 1))
+
+    def _now(self) -> float:
+        return time.monotonic() - self._t0
+
+    def _integration_time(self, function: str) -> float:
+        if function == "FREQ":
+            return self.aperture or self._timing["freq_aperture"]
+        factor = self._timing["autozero_factor"] if self.autozero else 1
+        return self.nplc.get(function, 1.0) * factor / self.line_frequency
+
+    def _signal(self, channel: Optional[int], function: str) -> float:
+        if function == "TEMP":
+            return self._temperature(channel)
+        wave = self.waveforms.get(channel)
+        if wave is None:
+            wave = DEFAULT_WAVEFORMS[function]
+            # channels differ slightly from each other
+            return wave(self._now()) * (1 + 0.01 * ((channel or 0) % 10))
+        return wave(self._now())
+
+    def _temperature(self, channel: Optional[int]) -> float:
+        """Temperature of the resistance signal of an RTD or thermistor channel."""
+        kind, parameter = self.transducers.get(channel, ("RTD", 85))
+        resistance = self._signal(channel, "RES" if kind == "THER" else "RTD")
+        kind = "RTD" if kind == "FRTD" else kind
+        return float(TRANSDUCERS[kind, parameter](resistance))
+
+    def _reading(
+        self, channel: Optional[int], function: str, settled: bool = False
+    ) -> float:
+        """One reading including integration time and noise.
+
+        Unless the caller already waited for the relay (settled), a reading
+        started within the settle time shows the transient from the previously
+        closed channel.
+        """
+        started = self._now()
+        self._delay(self._integration_time(function))
+        value = self._signal(channel, function)
+        # integration noise falls with the square root of the integration time
+        nplc = self.nplc.get(function, 1.0)
+        value += self._rng.gauss(0.0, abs(value) * 2e-6 / math.sqrt(nplc))
+        elapsed = started - self.closed_at
+        if not settled and channel is not None and elapsed < self.relay_settle:
+            tau = self.relay_settle / 5
+            value += (self.previous_value - value) * math.exp(-max(elapsed, 0) / tau)
+        self.previous_value = value
+        return value
+
+    def _close(self, channel: int):
+        if channel != self.closed:
+            self.closed = channel
+            self.closed_at = self._now()
+
+    def _scan_channels(self) -> List[Optional[int]]:
+        """Channels of the readings of one INIT: the scan list of the DAQ970A, or
+        the internal scan list (else the closed channel) repeated by the sample
+        and trigger counts of the Keithley 2000."""
+        if self.model != "Keithley2000":
+            # the DAQ970A sweeps the scan list SAMP:COUN times
+            return self.scan_list * self.sample_count
+        channels = self.scan_list if self.scan_enabled else [self.closed]
+        count = self.sample_count * self.trigger_count
+        return [channels[i % len(channels)] for i in range(count)]
+
+    def _scan(self) -> List[float]:
+        """Runs the scan list: close, settle and measure every channel."""
+        readings = []
+        for channel in self._scan_channels():
+            if channel is not None:
+                self._close(channel)
+                self._delay(self.relay_settle)
+            function = self.functions.get(channel, self.function)
+            readings.append(self._reading(channel, function, settled=True))
+        return readings
+
+    def _execute(self, command: str) -> Optional[str]:
+        """Executes one SCPI command and returns the response of queries."""
+        command = command.lstrip(":")
+        upper = command.upper()
+        header = upper.split(" ")[0]
+        if upper == "*RST":
+            self._reset()
+        elif upper == "*CLS":
+            self.errors = []
+        elif upper == "*IDN?":
+            return IDN[self.model]
+        elif upper == "SYST:LFR?":
+            return f"{self.line_frequency:g}"
+        elif upper.startswith("SYST:ERR"):
+            return self.errors.pop(0) if self.errors else '0,"No error"'
+        elif header.endswith(("SYST:AZER:STAT", "ZERO:AUTO")):
+            # autozero is modelled for all functions and channels at once
+            self.autozero = upper.split()[1].split(",")[0] in ("ON", "1", "ONCE")
+        elif header.startswith("SENS:FREQ:APER"):
+            self.aperture = _number(command)
+        elif header.startswith(("ROUT:CLOS", "ROUTE:CLOS")):
+            channels = _channel_list(command)
+            if self.scan_enabled:
+                self.errors.append('-221,"Settings conflict"')
+            elif channels:
+                self._close(channels[0])
+        elif header.startswith(("ROUT:OPEN", "ROUTE:OPEN")):
+            self.closed = None
+            self.scan_enabled = False
+        elif header in ("ROUT:SCAN", "ROUTE:SCAN", "ROUT:SCAN:INT", "ROUTE:SCAN:INT"):
+            self.scan_list = _channel_list(command)
+            if self.model == "Keithley2000":
+                if not 2 <= len(self.scan_list) <= 10:
+                    self.errors.append('-222,"Parameter data out of range"')
+                    self.scan_list = []
+                # defining the internal scan list enables the scan
+                self.scan_enabled = bool(self.scan_list)
+        elif header in ("ROUT:SCAN:LSEL", "ROUTE:SCAN:LSEL"):
+            self.scan_enabled = upper.split()[-1].startswith("INT")
+            self.scan_enabled = self.scan_enabled and bool(self.scan_list)
+        elif header.startswith("SAMP:COUN") and "?" not in header:
+            self.sample_count = int(_number(command))
+        elif header.startswith("TRIG:COUN") and "?" not in header:
+            self.trigger_count = int(_number(command))
+        elif header.startswith("TRAC:POIN") and "?" not in header:
+            self.buffer_points = int(_number(command))
+        elif header.startswith(("TRAC:CLE", "TRAC:CLEAR")):
+            self.buffer = []
+        elif header == "TRAC:FEED:CONT":
+            self.buffer_armed = upper.split()[-1].startswith("NEXT")
+            if self.buffer_armed:
+                self.buffer = []
+        elif upper == "TRAC:DATA?":
+            time.sleep(max(0.0, self._fetch_ready - self._now()))
+            return self._format(self.buffer)
+        elif upper == "*OPC?":
+            # answers once the pending INIT is complete
+            time.sleep(max(0.0, self._fetch_ready - self._now()))
+            return "1"
+        elif upper == "*WAI":
+            time.sleep(max(0.0, self._fetch_ready - self._now()))
+        elif header.startswith("CALC:AVER:CLE"):
+            self.scan_readings = []
+        elif header.startswith("CALC:AVER:") and header.endswith("?"):
+            name = header.split(":")[2].rstrip("?")
+            channels = _channel_list(command) or sorted(
+                {channel for channel, _ in self.scan_readings}
+            )
+            return ",".join(
+                "{:+.8E}".format(
+                    _statistic(
+                        name, [v for ch, v in self.scan_readings if ch == channel]
+                    )
+                )
+                for channel in channels
+            )
+        elif header == "CALC2:FORM":
+            self.calc2_format = upper.split()[-1]
+        elif header == "CALC2:STAT":
+            self.calc2_enabled = upper.split()[-1] in ("ON", "1")
+        elif upper in ("CALC2:IMM?", "CALC2:DATA?"):
+            if upper == "CALC2:IMM?" and self.calc2_enabled:
+                self.calc2_result = _statistic(self.calc2_format, self.buffer)
+            return self._format([self.calc2_result])
+        elif header.startswith("FUNC") and "?" not in header:
+            self.function = command.split('"')[1].upper() if '"' in command else ""
+        elif upper == "FUNC?":
+            return f'"{self.function}"'
+        elif header.startswith("CONF:"):
+            function = header[len("CONF:") :]
+            function = "VOLT:DC" if function == "VOLT" else function
+            channels = _channel_list(command)
+            if function == "TEMP":
+                transducer = self._transducer(command)
+                if transducer is None:
+                    self.errors.append('-224,"Illegal parameter value"')
+                    return ""
+                for channel in channels:
+                    self.transducers[channel] = transducer
+            if channels:
+                # CONF sets the function and redefines the scan list
+                for channel in channels:
+                    self.functions[channel] = function
+                self.scan_list = channels
+            else:
+                # CONF returns the trigger model to one-shot readings
+                self.function = function
+                self._reset_trigger_model()
+        elif header.startswith("FORM") and "?" not in header:
+            if self.model != "Keithley2000" and "ELEM" not in header:
+                self.errors.append('-113,"Undefined header"')
+            elif header.endswith("BORD"):
+                self.swapped = upper.split()[-1].startswith("SWAP")
+            elif header in ("FORM", "FORM:DATA"):
+                value = upper.split()[-1]
+                self.data_format = {"SRE": "SREAL", "DRE": "DREAL"}.get(
+                    value[:3], "ASCII"
+                )
+        elif header.startswith("SENS:") and "NPLC" in header:
+            function = header.split(":")[1]
+            function = {"VOLT": "VOLT:DC", "CURR": "CURR:DC"}.get(function, function)
+            self.nplc[function] = _number(command)
+        elif header.startswith("SENS:"):
+            pass  # range and digits do not change the simulated readings
+        elif upper == "INIT":
+            started = self._now()
+            # the scan runs in the background, FETC? waits for its end
+            self._fetch = self._scan_timed()
+            self.scan_readings = list(zip(self._scan_channels(), self._fetch))
+            self._fetch_ready = started + self._scan_duration() * self.time_scale
+            if self.buffer_armed:
+                # the buffer stops storing when it is full
+                self.buffer = self._fetch[: self.buffer_points]
+                self.buffer_armed = False
+        elif upper == "FETC?":
+            if self._fetch is None:
+                self.errors.append('-230,"Data corrupt or stale"')
+                return None
+            time.sleep(max(0.0, self._fetch_ready - self._now()))
+            readings, self._fetch = self._fetch, None
+            return self._format(readings)
+        elif upper == "READ?":
+            if self.model == "KeysightDAQ970A" or self.sample_count > 1:
+                readings = self._scan()
+            else:
+                readings = [self._reading(self.closed, self.function)]
+            return self._format(readings)
+        elif upper.endswith("?"):
+            self.errors.append('-113,"Undefined header"')
+            return None
+        return ""
+
+    def _transducer(self, command: str) -> Optional[tuple]:
+        """(type, parameter) of CONF:TEMP <type>[,<parameter>][,(@list)], None if
+        the type is not simulated."""
+        arguments = command.split(" ", 1)[1] if " " in command else ""
+        arguments = arguments.split("(@")[0].upper()
+        parts = [part.strip() for part in arguments.split(",") if part.strip()]
+        kind = parts[0] if parts else "TC"
+        if kind not in TRANSDUCER_DEFAULTS:
+            return None
+        parameter = int(float(parts[1])) if len(parts) > 1 else None
+        parameter = parameter or TRANSDUCER_DEFAULTS[kind]
+        if ("RTD" if kind == "FRTD" else kind, parameter) not in TRANSDUCERS:
+            return None
+        return kind, parameter
+
+    def _format(self, readings: List[float]):
+        """Readings in the selected data format, bytes for the binary ones."""
+        if self.data_format == "ASCII":
+            return ",".join(f"{v:+.8E}" for v in readings)
+        # swapped byte order is little endian
+        order = "<" if self.swapped else ">"
+        code = order + ("d" if self.data_format == "DREAL" else "f")
+        return b"".join(b"#0" + struct.pack(code, v) for v in readings) + b"\n"
+
+    def _scan_duration(self) -> float:
+        return sum(
+            self.relay_settle
+            + self._integration_time(self.functions.get(channel, self.function))
+            for channel in self._scan_channels()
+        )
+
+    def _scan_timed(self) -> List[float]:
+        """Readings of a background scan, taken without blocking INIT."""
+        time_scale, self.time_scale = self.time_scale, 0.0
+        try:
+            return self._scan()
+        finally:
+            self.time_scale = time_scale